@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+from pathlib import Path
+import random
+
+from dgus import config, display
+from dgus.coalesce import Coalescer
+from dgus.common import VP_Type, VPRam
+from dgus.project import Project
+
+def load_trace(f) -> list:
+    # as recorded by `python -m dgus.sim --record`
+    trace = []
+    for line in f:
+        e = json.loads(line)
+        trace.append((e['t'], e['addr'], bytes.fromhex(e['data'])))
+    return trace
+
+def synthesize_trace(project, page, rate, seconds, seed) -> list:
+    # a host refreshing every displayed VP of a page, one write per VP
+    rng = random.Random(seed)
+    ram = VPRam()
+    controls = [c for c in project.by_pic[page] if isinstance(c, display.DisplayVariable) and c.vp.size]
+    trace = []
+    for tick in range(int(rate * seconds)):
+        for c in controls:
+            vp = c.vp
+            if vp.type == VP_Type.TEXT:
+                if rng.random() < 0.05:
+                    ram.write(vp, bytes(rng.choice(b'0123456789 ') for _ in range(vp.size)))
+            elif rng.random() < 0.3:
+                ram.write(vp, rng.getrandbits(8 * vp.size if vp.type != VP_Type.BIT else 1))
+            addr, words = ram.word_span(vp)
+            trace.append((tick / rate, addr * 2, bytes(ram.mem[addr * 2:(addr + words) * 2])))
+    return trace
+
+def dedup(project, trace, timing):
+    # writes left once the ones that change nothing on the panel are
+    # dropped, each still in a frame of its own
+    ram = Coalescer(project, timing).sent.mem
+    frames = data = 0
+    for t, addr, payload in trace:
+        if ram[addr:addr + len(payload)] != payload:
+            ram[addr:addr + len(payload)] = payload
+            frames += 1
+            data += timing.frame_overhead + len(payload)
+    return frames, data
+
+def replay(project, trace, interval, timing):
+    coalescer = Coalescer(project, timing)
+    frames = data = 0
+    deadline = None
+    for t, addr, payload in trace:
+        if deadline is not None and t >= deadline:
+            for f in coalescer.flush():
+                frames += 1
+                data += len(f)
+            deadline = None
+        if deadline is None:
+            deadline = t + interval
+        coalescer.write(addr, payload)
+    for f in coalescer.flush():
+        frames += 1
+        data += len(f)
+    return frames, data
+
+### main ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('--trace', type=argparse.FileType('r'), help='recorded VP write trace (default: synthesize one)')
+    parser.add_argument('--page', type=int, default=1, help='page to synthesize updates for')
+    parser.add_argument('--rate', type=float, default=10.0, help='synthesized refreshes per second')
+    parser.add_argument('--seconds', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--interval-ms', type=float, default=20.0, help='coalescing window')
+    parser.add_argument('--baud', type=int, help='line speed (default: from CONFIG.txt)')
+    args = parser.parse_args()
+
+    project = Project(args.basedir)
+    timing = config.timing(args.basedir)
+    if args.baud:
+        timing.baud = args.baud
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        trace = synthesize_trace(project, args.page, args.rate, args.seconds, args.seed)
+    duration = max(trace[-1][0] - trace[0][0], 1e-9) if trace else 1.0
+
+    naive_frames = len(trace)
+    naive_bytes = sum(timing.frame_overhead + len(p) for t, a, p in trace)
+    dedup_frames, dedup_bytes = dedup(project, trace, timing)
+    frames, data = replay(project, trace, args.interval_ms / 1000, timing)
+
+    bytes_per_sec = timing.bytes_per_sec
+    for name, f, b in (('naive', naive_frames, naive_bytes), ('dedup', dedup_frames, dedup_bytes),
+                       ('coalesced', frames, data)):
+        print(f'{name:>9}: {f / duration:8.1f} frames/s {b / duration:9.1f} bytes/s '
+              f'({100 * b / duration / bytes_per_sec:5.1f}% of {timing.baud} baud)')
+    # dropping unchanged values and merging neighbours are separate wins
+    for name, before, after in (('dedup', (naive_frames, naive_bytes), (dedup_frames, dedup_bytes)),
+                                ('merge', (dedup_frames, dedup_bytes), (frames, data))):
+        if before[0] and before[1]:
+            print(f'{name:>9}: saved {(before[0] - after[0]) / duration:8.1f} frames/s '
+                  f'({100 * (before[0] - after[0]) / before[0]:.1f}%), '
+                  f'{(before[1] - after[1]) / duration:9.1f} bytes/s '
+                  f'({100 * (before[1] - after[1]) / before[1]:.1f}%)')
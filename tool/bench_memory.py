@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import argparse
+import gc
+import io
+from pathlib import Path
+import subprocess
+import sys
+import tarfile
+import tempfile
+import tracemalloc
+
+from dgus import display, touch
+try:
+    from dgus.project import Project
+except ImportError:
+    # revisions from before the project index: only the records are measured
+    Project = None
+
+def traced(fn):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return result, sum(s.size_diff for s in after.compare_to(before, 'filename'))
+
+def controls(basedir) -> list:
+    # the parsed records alone, without the icon tables, pages and indexes
+    # a project adds
+    return [*touch.Parser(basedir), *display.Parser(basedir)]
+
+def run_at(rev, argv):
+    # this benchmark against the dgus package of another git revision, e.g.
+    # the dict-backed records from before they got __slots__
+    here = Path(__file__).resolve().parent
+    top, prefix = subprocess.run(['git', '-C', str(here), 'rev-parse', '--show-toplevel', '--show-prefix'],
+                                 check=True, capture_output=True, text=True).stdout.splitlines()
+    # archived from the top, git refuses tree paths relative to a subdirectory
+    tar = subprocess.run(['git', '-C', top, 'archive', f'{rev}:{prefix}', 'dgus'],
+                         check=True, capture_output=True).stdout
+    with tempfile.TemporaryDirectory() as d:
+        tarfile.open(fileobj=io.BytesIO(tar)).extractall(d)
+        script = Path(d) / Path(__file__).name
+        script.write_bytes(Path(__file__).read_bytes())
+        return subprocess.run([sys.executable, str(script), *argv]).returncode
+
+### main ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('-n', '--count', type=int, default=10,
+                        help='number of copies of the project held in memory at once')
+    parser.add_argument('--rev', help='measure the dgus package of this git revision instead, '
+                        'e.g. one from before the records got __slots__ (any revision works for '
+                        'the records, per project needs the project index)')
+    args = parser.parse_args()
+    if args.rev:
+        sys.exit(run_at(args.rev, [str(args.basedir.resolve()), '-n', str(args.count)]))
+
+    # warm up lazy imports (PIL plugins etc.) so they aren't counted
+    controls(args.basedir)
+    if Project is not None:
+        Project(args.basedir)
+
+    lists, total = traced(lambda: [controls(args.basedir) for _ in range(args.count)])
+    print(f'{args.count} x {len(lists[0])} controls of {args.basedir}')
+    print(f'per control: {total // (args.count * len(lists[0])):10} bytes')
+    if Project is not None:
+        # everything a project holds: records, icon tables, pages, indexes
+        projects, total = traced(lambda: [Project(args.basedir) for _ in range(args.count)])
+        print(f'per project: {total // args.count:10} bytes ({projects[0]})')
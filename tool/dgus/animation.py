@@ -0,0 +1,100 @@
+import argparse
+from pathlib import Path
+from . import display
+from .project import Project
+
+# pixels per second the panel can redraw for animations before touch
+# handling lags, roughly 15 full 480x272 screens
+FILL_BUDGET = 2_000_000
+# bit icon animations step at the system animation rate, the record has
+# no frame time of its own
+ICON_FRAME_MS = 100
+# states (bit clear, bit set) whose icon range is played as an animation,
+# per bit icon mode. Unknown modes are assumed to animate both.
+BITICON_ANIMATED = {
+    0x00: (True, True),
+    0x01: (False, True),
+    0x02: (True, False),
+    0x03: (False, False),
+}
+
+class Animation:
+    __slots__ = ('control', 'pixels', 'fps')
+
+    def __init__(self, control, pixels, fps) -> None:
+        self.control = control
+        self.pixels = pixels
+        self.fps = fps
+
+    @property
+    def fill_rate(self) -> float:
+        return self.pixels * self.fps
+
+    def __str__(self) -> str:
+        return '{:9.0f} px/s ({} px at {:.1f} fps) [{}]'.format(self.fill_rate, self.pixels, self.fps, self.control)
+
+def icon_pixels(project, lib_id, first, last) -> int:
+    # largest icon of the range, frames are drawn over each other
+    lib = project.iconlibs.get(lib_id)
+    if lib is None:
+        return 0
+    return max((i.size[0] * i.size[1] for i in lib.icons[first:last + 1]), default=0)
+
+def image_animation(project, c, icon_frame_ms):
+    if c.pic_end == c.pic_begin:
+        return None
+    page = project.pages.get(int(c.pic_begin)) or project.pages.get(int(c.pic))
+    if page is None:
+        return None
+    # every frame is a full picture
+    return Animation(c, page.size[0] * page.size[1], 1000 / (max(c.frame_time_8ms, 1) * 8))
+
+def bit_icon(project, c, icon_frame_ms):
+    # worst case of the two states, the bit decides which one plays
+    ranges = ((c.icon0s, c.icon0e), (c.icon1s, c.icon1e))
+    pixels = 0
+    for animated, (first, last) in zip(BITICON_ANIMATED.get(c.mode, (True, True)), ranges):
+        if animated and last > first:
+            pixels = max(pixels, icon_pixels(project, c.icon_lib, first, last))
+    if not pixels:
+        return None
+    return Animation(c, pixels, 1000 / icon_frame_ms)
+
+ESTIMATORS = {
+    display.ImageAnimation: image_animation,
+    display.BitIcon: bit_icon,
+}
+
+def page_loads(project, icon_frame_ms=ICON_FRAME_MS) -> dict:
+    # pic -> animations that may run at the same time on that page
+    loads = {}
+    for cls, estimate in ESTIMATORS.items():
+        for c in project.of_class(cls):
+            a = estimate(project, c, icon_frame_ms)
+            if a is not None:
+                loads.setdefault(int(c.pic), []).append(a)
+    return loads
+
+def over_budget(project, budget=FILL_BUDGET, icon_frame_ms=ICON_FRAME_MS) -> list:
+    # (pic, total px/s, animations) of every page over budget
+    out = []
+    for pic, anims in sorted(page_loads(project, icon_frame_ms).items()):
+        total = sum(a.fill_rate for a in anims)
+        if total > budget:
+            out.append((pic, total, anims))
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('--budget', type=float, default=FILL_BUDGET, help='animation fill budget in pixels/s')
+    parser.add_argument('--icon-frame-ms', type=float, default=ICON_FRAME_MS, help='bit icon animation frame time')
+    args = parser.parse_args()
+    project = Project(args.basedir)
+    for pic, anims in sorted(page_loads(project, args.icon_frame_ms).items()):
+        total = sum(a.fill_rate for a in anims)
+        flag = ' OVER BUDGET' if total > args.budget else ''
+        print(f'P{pic:<3} {total:9.0f} px/s, {100 * total / args.budget:.0f}% of budget{flag}')
+        for a in sorted(anims, key=lambda a: -a.fill_rate):
+            print('  ', a)
@@ -0,0 +1,103 @@
+from . import config, touch
+from .config import CMD_WRITE_VP
+from .common import VP_Type, VPRam, RAM_SIZE
+
+class Coalescer:
+    def __init__(self, project=None, timing=None, *, init=None) -> None:
+        # frame header, CRC16 and line speed from the project's CONFIG.txt
+        # unless given
+        if timing is None:
+            timing = config.timing(project.basedir) if project is not None else config.Timing()
+        self.timing = timing
+        # what the host wants the panel to show, and what it has been sent
+        self.shadow = VPRam()
+        self.sent = VPRam()
+        # bytes whose panel contents we actually know: only those may be
+        # sent as filler or as the rest of a partially updated word
+        self.known = bytearray(RAM_SIZE)
+        self.dirty = set()
+        self.overhead = timing.frame_overhead
+        # less the command and word address
+        self.max_words = (timing.max_payload - 3) // 2
+        # words the panel writes itself (touch input) are never written as
+        # filler, and always sent when dirty: our copy of them may be stale
+        # unless observe() read them back since the last flush
+        self.volatile = bytearray(RAM_SIZE // 2)
+        self.observed = set()
+        if project is not None:
+            for c in project.of_class(touch.TouchControl):
+                if c.vp.size:
+                    self.mark_volatile(c.vp.addr, c.vp.end)
+            if init is None:
+                init = config.initial_ram(project.basedir)
+        # VP memory as the panel starts, known from the first write on
+        if init is not None:
+            self.observe(0, init.mem)
+
+    def mark_volatile(self, start, end):
+        for w in range(start // 2, (end + 1) // 2):
+            self.volatile[w] = 1
+
+    def observe(self, addr, data):
+        # VP contents read back from (or uploaded by) the panel
+        for mem in (self.shadow.mem, self.sent.mem):
+            mem[addr:addr + len(data)] = data
+        self.known[addr:addr + len(data)] = b'\x01' * len(data)
+        self.observed.update(range(addr // 2, (addr + len(data) + 1) // 2))
+
+    def require_known(self, start, end, keep=()):
+        # frames carry whole words: the bytes of [start, end)'s words that
+        # aren't overwritten (or only partly, keep) are resent as they are
+        for b in range(start & ~1, (end + 1) & ~1):
+            if (b < start or b >= end or b in keep) and not self.known[b]:
+                raise ValueError(f'byte 0x{b:x} was never written or observed, '
+                                 f'observe() it before a partial word update')
+
+    def update(self, vp, value):
+        # BIT and low/high BYTE VPs only change part of a word: the rest of
+        # the word is written back from the shadow copy, so it must be known
+        keep = (vp.addr,) if vp.type == VP_Type.BIT else ()
+        self.require_known(vp.addr, vp.end, keep)
+        self.shadow.write(vp, value)
+        self.known[vp.addr:vp.end] = b'\x01' * (vp.end - vp.addr)
+        self.dirty.update(range(vp.addr // 2, (vp.end + 1) // 2))
+
+    def write(self, addr, data):
+        self.require_known(addr, addr + len(data))
+        self.shadow.mem[addr:addr + len(data)] = data
+        self.known[addr:addr + len(data)] = b'\x01' * len(data)
+        self.dirty.update(range(addr // 2, (addr + len(data) + 1) // 2))
+
+    def word_known(self, w) -> bool:
+        return bool(self.known[w * 2] and self.known[w * 2 + 1])
+
+    def changed(self, w) -> bool:
+        if self.volatile[w] and w not in self.observed:
+            return True
+        return self.shadow.mem[w * 2:w * 2 + 2] != self.sent.mem[w * 2:w * 2 + 2]
+
+    def runs(self) -> list:
+        # [first, last] word ranges to send, bridging gaps cheaper than a header
+        words = sorted(w for w in self.dirty if self.changed(w))
+        runs = []
+        for w in words:
+            if runs:
+                first, last = runs[-1]
+                gap = range(last + 1, w)
+                if (w - first < self.max_words and len(gap) * 2 <= self.overhead
+                        and not any(self.volatile[g] or not self.word_known(g) for g in gap)):
+                    runs[-1][1] = w
+                    continue
+            runs.append([w, w])
+        return runs
+
+    def flush(self) -> list:
+        frames = []
+        for first, last in self.runs():
+            data = bytes(self.shadow.mem[first * 2:last * 2 + 2])
+            self.sent.mem[first * 2:last * 2 + 2] = data
+            payload = bytes([CMD_WRITE_VP]) + first.to_bytes(2, 'big') + data
+            frames.append(self.timing.frame(payload))
+        self.dirty.clear()
+        self.observed.clear()
+        return frames
@@ -1,6 +1,8 @@
 from ctypes import *
 from enum import Enum, unique
 from functools import total_ordering
+from mmap import mmap, ACCESS_READ
+import traceback
 import webcolors
 
 # just for better documentation and BE support. No need to define __bool__(self)
@@ -18,6 +20,8 @@ class VP_Type(Enum):
     QWORD = 8
 
 class VP:
+    __slots__ = ('addr', 'type', 'size', 'bit')
+
     def __init__(self, word_addr=None) -> None:
         self.addr = word_addr * 2 if word_addr is not None else None
         self.type = None
@@ -53,7 +57,7 @@ class VP:
         elif 2 == vp_format:
             self.set_type(VP_Type.BYTE, low_byte=True)
         else:
-            raise ValueError(vp_format)
+            raise ValueError(f'bad vp_format {vp_format}')
 
     def set_from_vp_format_numeric(self, vp_format: c_uint8):
         if vp_format in (0, 5):
@@ -67,7 +71,7 @@ class VP:
         elif 4 == vp_format:
             self.set_type(VP_Type.QWORD)
         else:
-            raise ValueError(vp_format)
+            raise ValueError(f'bad vp_format {vp_format}')
 
     def __str__(self) -> str:
         if self.type == VP_Type.BIT:
@@ -83,6 +87,33 @@ class VP:
     def end(self) -> int:
         return self.addr + self.size
 
+RAM_SIZE = 4096
+
+class VPRam:
+    def __init__(self, size=RAM_SIZE) -> None:
+        self.mem = bytearray(size)
+
+    def read(self, vp):
+        if vp.type == VP_Type.BIT:
+            return self.mem[vp.addr] >> vp.bit & 1
+        if vp.type == VP_Type.TEXT:
+            return bytes(self.mem[vp.addr:vp.end])
+        return int.from_bytes(self.mem[vp.addr:vp.end], 'big')
+
+    def write(self, vp, value):
+        if vp.type == VP_Type.BIT:
+            self.mem[vp.addr] = self.mem[vp.addr] & ~(1 << vp.bit) | (value & 1) << vp.bit
+        elif vp.type == VP_Type.TEXT:
+            self.mem[vp.addr:vp.end] = value[:vp.size].ljust(vp.size, b'\x00')
+        else:
+            self.mem[vp.addr:vp.end] = (value % (1 << 8 * vp.size)).to_bytes(vp.size, 'big')
+
+    @staticmethod
+    def word_span(vp):
+        # (word address, word count) covering the VP
+        start = vp.addr // 2
+        return start, (vp.end + 1) // 2 - start
+
 class Pic(c_uint16):
     def __int__(self) -> int:
         return self.value
@@ -183,3 +214,37 @@ class Area(BigEndianStructure):
 
     def __str__(self) -> str:
         return '@{} +{}'.format(self.start, self.size())
+
+# failures parsers catch instead of aborting when not strict
+PARSE_ERRORS = (AssertionError, KeyError, ValueError)
+
+def map_file(f, strict, diagnostics, filename):
+    # read-only mapping of f, mmap refuses empty files: those parse as an
+    # empty buffer and a diagnostic unless strict
+    try:
+        return mmap(f.fileno(), 0, access=ACCESS_READ)
+    except ValueError as e:
+        if strict:
+            raise
+        diagnostics.append(Diagnostic(filename, 0, e))
+        return b''
+
+class Diagnostic:
+    __slots__ = ('filename', 'offset', 'error', 'message')
+
+    def __init__(self, filename, offset, error) -> None:
+        self.filename = filename
+        self.offset = offset
+        self.error = error.__class__.__name__
+        msg = str(error).strip()
+        if any(c.isalpha() for c in msg):
+            self.message = msg
+        else:
+            # bare assert or just a value: the failing source line says what
+            # was checked, if its source is around
+            tb = traceback.extract_tb(error.__traceback__)
+            line = (tb[-1].line if tb else None) or 'check failed'
+            self.message = f'{line} ({msg})' if msg else line
+
+    def __str__(self) -> str:
+        return '{}+0x{:x}: {}: {}'.format(self.filename, self.offset, self.error, self.message)
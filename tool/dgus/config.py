@@ -0,0 +1,210 @@
+import argparse
+from pathlib import Path
+import re
+from .common import VPRam, RAM_SIZE
+
+# CONFIG.txt R1 codes
+BAUD_RATES = {
+    0x00: 1200, 0x01: 2400, 0x02: 4800, 0x03: 9600,
+    0x04: 19200, 0x05: 38400, 0x06: 57600, 0x07: 115200,
+    0x08: 28800, 0x09: 76800, 0x0a: 62500, 0x0b: 125000,
+    0x0c: 250000, 0x0d: 230400, 0x0e: 345600, 0x0f: 691200,
+    0x10: 921600,
+}
+# R2 (Sys_CFG) bits
+SYS_CRC = 0x80
+SYS_L22_INIT = 0x20
+# what the host driver and the tools here are set up for
+DEFAULT_BAUD = 250000
+FRAME_HEADER = b'\x5a\xa5'
+# frame commands
+CMD_WRITE_REG = 0x80
+CMD_READ_REG = 0x81
+CMD_WRITE_VP = 0x82
+CMD_READ_VP = 0x83
+BITS_PER_BYTE = 10 # 8N1
+
+def crc16(data) -> int:
+    # CRC16/MODBUS, sent low byte first
+    crc = 0xffff
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xa001 if crc & 1 else crc >> 1
+    return crc
+
+class Config:
+    # CONFIG.txt: 'Rn=hh ;comment' register lines and bare commands
+    __slots__ = ('regs', 'commands')
+
+    def __init__(self, text: str) -> None:
+        self.regs = {}
+        self.commands = []
+        for line in text.splitlines():
+            line = line.split(';', 1)[0].strip()
+            if not line:
+                continue
+            m = re.fullmatch(r'R([0-9A-F])\s*=\s*([0-9A-F]{1,2})', line, re.I)
+            if m:
+                self.regs[int(m.group(1), 16)] = int(m.group(2), 16)
+            else:
+                self.commands.append(line)
+
+    @classmethod
+    def load(cls, basedir):
+        f = Path(basedir) / 'DWIN_SET' / 'CONFIG.txt'
+        return cls(f.read_text(errors='replace')) if f.exists() else None
+
+    @property
+    def baud(self):
+        return BAUD_RATES.get(self.regs.get(0x1))
+
+    @property
+    def sys_cfg(self) -> int:
+        return self.regs.get(0x2, 0)
+
+    @property
+    def crc(self) -> bool:
+        return bool(self.sys_cfg & SYS_CRC)
+
+    @property
+    def l22_init(self) -> bool:
+        return bool(self.sys_cfg & SYS_L22_INIT)
+
+    @property
+    def frame_header(self) -> bytes:
+        return bytes([self.regs.get(0x3, FRAME_HEADER[0]), self.regs.get(0xa, FRAME_HEADER[1])])
+
+    def __str__(self) -> str:
+        regs = ' '.join(f'R{r:X}={v:02X}' for r, v in sorted(self.regs.items()))
+        return f'{regs} ({self.baud} baud, header {self.frame_header.hex()}, crc {self.crc}, ' \
+            f'22 init {self.l22_init})'
+
+class VarInit:
+    # 22_Config.bin: VP memory image the panel loads at power on when
+    # Sys_CFG asks for it, byte addresses from 0
+    __slots__ = ('filename', 'data')
+
+    def __init__(self, filename: Path) -> None:
+        self.filename = filename
+        self.data = filename.read_bytes()
+
+    @classmethod
+    def load(cls, basedir):
+        f = next((Path(basedir) / 'DWIN_SET').glob('22*.bin'), None)
+        return cls(f) if f is not None else None
+
+    def ram(self) -> VPRam:
+        ram = VPRam()
+        ram.mem[:] = self.data[:RAM_SIZE].ljust(RAM_SIZE, b'\x00')
+        return ram
+
+    def beyond_ram(self) -> int:
+        # bytes set past the end of the VP memory the tools model
+        return sum(1 for b in self.data[RAM_SIZE:] if b)
+
+def initial_ram(basedir):
+    # what VP memory holds at power on: 22_Config.bin when Sys_CFG loads it,
+    # None when that's unknown
+    cfg = Config.load(basedir)
+    init = VarInit.load(basedir)
+    if cfg is None or not cfg.l22_init or init is None:
+        return None
+    return init.ram()
+
+class Timing:
+    # serial link costs, from CONFIG.txt when there is one
+    __slots__ = ('baud', 'crc', 'header')
+
+    def __init__(self, baud=DEFAULT_BAUD, crc=False, header=FRAME_HEADER) -> None:
+        self.baud = baud
+        self.crc = crc
+        self.header = header
+
+    @classmethod
+    def from_config(cls, config):
+        if config is None or config.baud is None:
+            return cls()
+        return cls(config.baud, config.crc, config.frame_header)
+
+    @property
+    def byte_time(self) -> float:
+        return BITS_PER_BYTE / self.baud
+
+    @property
+    def bytes_per_sec(self) -> float:
+        return self.baud / BITS_PER_BYTE
+
+    @property
+    def frame_overhead(self) -> int:
+        # header, length, command, word address and the optional CRC16
+        return len(self.header) + 1 + 1 + 2 + (2 if self.crc else 0)
+
+    @property
+    def max_payload(self) -> int:
+        # the length byte counts the command, address, data and CRC16
+        return 0xff - (2 if self.crc else 0)
+
+    def frame(self, payload) -> bytes:
+        if self.crc:
+            payload = bytes(payload) + crc16(payload).to_bytes(2, 'little')
+        return self.header + bytes([len(payload)]) + payload
+
+    def unframe(self, body):
+        # payload of a received frame body (what the length byte counts),
+        # None when its CRC16 doesn't match
+        if not self.crc:
+            return body
+        if len(body) < 2 or crc16(body[:-2]).to_bytes(2, 'little') != body[-2:]:
+            return None
+        return body[:-2]
+
+    def frame_time(self, data_len) -> float:
+        return (self.frame_overhead + data_len) * self.byte_time
+
+    def __str__(self) -> str:
+        return '{} baud: {:.1f} us/byte, {} byte frame overhead ({:.0f} us), {:.0f} bytes/s'.format(
+            self.baud, self.byte_time * 1e6, self.frame_overhead, self.frame_time(0) * 1e6, self.bytes_per_sec)
+
+def timing(basedir) -> Timing:
+    return Timing.from_config(Config.load(basedir))
+
+def check(config, init, host_baud=DEFAULT_BAUD, host_crc=False) -> list:
+    # (is_error, message) for settings that break or slow down the host link
+    out = []
+    if config is None:
+        return out
+    if config.baud is None:
+        out.append((True, f'unknown baud rate code R1={config.regs.get(0x1, 0):02X}'))
+    elif config.baud < host_baud:
+        out.append((False, f'baud rate {config.baud} is below the {host_baud} the host uses, the link is throttled'))
+    if config.crc != host_crc:
+        if config.crc:
+            out.append((True, 'panel expects CRC16 on every frame, the host frames will be rejected'))
+        else:
+            out.append((True, 'panel sends no CRC16, the host will misread its frames'))
+    if config.frame_header != FRAME_HEADER:
+        out.append((True, f'frame header {config.frame_header.hex()} instead of {FRAME_HEADER.hex()}'))
+    if config.l22_init and init is None:
+        out.append((False, 'Sys_CFG loads 22_Config.bin at power on but there is none'))
+    elif init is not None and not config.l22_init:
+        out.append((False, f'{init.filename.name} is ignored, Sys_CFG does not load it'))
+    if init is not None and init.beyond_ram():
+        out.append((False, f'{init.filename.name} sets {init.beyond_ram()} bytes past VP memory end 0x{RAM_SIZE:x}'))
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('--host-baud', type=int, default=DEFAULT_BAUD)
+    parser.add_argument('--host-crc', action='store_true', help='the host sends and expects CRC16')
+    args = parser.parse_args()
+    config = Config.load(args.basedir)
+    init = VarInit.load(args.basedir)
+    print('config:', config or 'none')
+    if init is not None:
+        print(f'init: {init.filename.name} {len(init.data)} bytes, {sum(1 for b in init.data if b)} set')
+    print('timing:', Timing.from_config(config))
+    for is_error, msg in check(config, init, args.host_baud, args.host_crc):
+        print('ERROR:' if is_error else 'WARNING:', msg)
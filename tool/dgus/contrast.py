@@ -0,0 +1,85 @@
+import argparse
+from pathlib import Path
+import numpy as np
+from . import display
+from .pages import bmp_pixels, rgb565
+from .project import Project
+
+# WCAG 2 minimum contrast ratios: normal text, large text and graphics
+MIN_CONTRAST = 4.5
+MIN_CONTRAST_LARGE = 3.0
+LARGE_TEXT_PX = 24
+TEXT_CLASSES = (display.Numeric, display.Text, display.Curve)
+
+def luminance_table() -> np.ndarray:
+    # WCAG relative luminance of every RGB565 value
+    v = np.arange(1 << 16, dtype=np.uint32)
+    r, g, b = (v >> 11) & 0x1f, (v >> 5) & 0x3f, v & 0x1f
+    # expand like Color.rgb() does
+    rgb = np.stack([r << 3 | r >> 2, g << 2 | g >> 4, b << 3 | b >> 2]) / 255
+    lin = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return 0.2126 * lin[0] + 0.7152 * lin[1] + 0.0722 * lin[2]
+
+LUMINANCE = luminance_table()
+
+def contrast_ratio(a, b):
+    la, lb = LUMINANCE[a], LUMINANCE[b]
+    return (np.maximum(la, lb) + 0.05) / (np.minimum(la, lb) + 0.05)
+
+def min_contrast(c) -> float:
+    if isinstance(c, display.Curve):
+        return MIN_CONTRAST_LARGE
+    return MIN_CONTRAST_LARGE if c.y_px >= LARGE_TEXT_PX else MIN_CONTRAST
+
+class Finding:
+    __slots__ = ('control', 'background', 'coverage', 'ratio')
+
+    def __init__(self, control, background, coverage, ratio) -> None:
+        self.control = control
+        self.background = background
+        self.coverage = coverage
+        self.ratio = ratio
+
+    def __str__(self) -> str:
+        return '{:.2f}:1 against {} ({:.0f}% of area) [{}]'.format(
+            self.ratio, display.Color(self.background), 100 * self.coverage, self.control)
+
+class Checker:
+    def __init__(self, project) -> None:
+        self.project = project
+
+    def findings(self) -> list:
+        # every text control, with the color covering most of its area
+        out = []
+        for pic, page in sorted(self.project.pages.items()):
+            controls = [c for c in self.project.by_pic[pic] if isinstance(c, TEXT_CLASSES)]
+            if not controls:
+                continue
+            px = rgb565(bmp_pixels(page.filename))
+            h, w = px.shape
+            for c in controls:
+                # area end is inclusive
+                x0, y0 = min(c.area.start[0], w), min(c.area.start[1], h)
+                x1, y1 = min(c.area.end[0] + 1, w), min(c.area.end[1] + 1, h)
+                region = px[y0:y1, x0:x1]
+                if not region.size:
+                    continue
+                counts = np.bincount(region.ravel(), minlength=1 << 16)
+                background = int(counts.argmax())
+                coverage = counts[background] / region.size
+                ratio = float(contrast_ratio(c.color.value, background))
+                out.append(Finding(c, background, coverage, ratio))
+        return out
+
+    def low_contrast(self) -> list:
+        return [f for f in self.findings() if f.ratio < min_contrast(f.control)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('-a', '--all', action='store_true', help='print every control, not just low contrast ones')
+    args = parser.parse_args()
+    checker = Checker(Project(args.basedir))
+    for f in checker.findings() if args.all else checker.low_contrast():
+        print(f)
@@ -0,0 +1,195 @@
+import argparse
+from collections import defaultdict
+import hashlib
+from pathlib import Path
+import re
+import numpy as np
+from .common import Area, Coord
+from .iconlib import MAX_ICON_DIMS
+from .pages import bmp_pixels, rgb565
+
+# pages are compared in TILE x TILE blocks, small enough that a changed
+# label only dirties a few of them
+TILE = 16
+# a page sharing at least this much with another is a candidate to be
+# drawn as that page plus icons
+SHARED_THRESHOLD = 0.5
+# icon library index entry per icon
+ICON_ENTRY_SIZE = 8
+
+class PageSet:
+    # every page bmp of one resolution as a single (pages, height, width)
+    # RGB565 array
+    def __init__(self, files, size) -> None:
+        self.files = files
+        w, h = size
+        self.pixels = np.empty((len(files), h, w), np.uint16)
+        for n, f in enumerate(files):
+            self.pixels[n] = rgb565(bmp_pixels(f))
+        self.picture_bytes = w * h * 2
+        self.tiles_y, self.tiles_x = -(-h // TILE), -(-w // TILE)
+
+    def names(self, idx):
+        return [self.files[i].name for i in idx]
+
+    def exact_hashes(self) -> list:
+        return [hashlib.sha1(p.tobytes()).hexdigest() for p in self.pixels]
+
+    def perceptual_hashes(self) -> np.ndarray:
+        # average hash: 8x8 block means of the luminance against their mean
+        n, h, w = self.pixels.shape
+        p = self.pixels[:, :h // 8 * 8, :w // 8 * 8]
+        luma = (p >> 11) * (0.299 * 2) + (p >> 5 & 0x3f) * 0.587 + (p & 0x1f) * (0.114 * 2)
+        blocks = luma.reshape(n, 8, h // 8, 8, w // 8).mean(axis=(2, 4)).reshape(n, 64)
+        return blocks > blocks.mean(axis=1, keepdims=True)
+
+    def tile_fingerprints(self) -> np.ndarray:
+        # (pages, tiles) of 64-bit fingerprints, equal tiles hash equal
+        n, h, w = self.pixels.shape
+        ty, tx = self.tiles_y, self.tiles_x
+        weights = np.random.default_rng(0).integers(1, 1 << 63, TILE * TILE, np.uint64)
+        padded = np.zeros((ty * TILE, tx * TILE), np.uint64)
+        out = np.empty((n, ty * tx), np.uint64)
+        for i in range(n):
+            padded[:h, :w] = self.pixels[i]
+            tiles = padded.reshape(ty, TILE, tx, TILE).transpose(0, 2, 1, 3).reshape(ty * tx, TILE * TILE)
+            out[i] = tiles @ weights
+        return out
+
+    def shared(self) -> np.ndarray:
+        # (pages, pages) fraction of tiles two pages have in common
+        fp = self.tile_fingerprints()
+        n = len(fp)
+        out = np.eye(n)
+        for i in range(n - 1):
+            out[i, i + 1:] = out[i + 1:, i] = (fp[i + 1:] == fp[i]).mean(axis=1)
+        return out
+
+    def diff_regions(self, a, b) -> list:
+        # Areas where page b differs from page a: connected runs of changed
+        # tiles, shrunk to the changed pixels
+        mask = self.pixels[a] != self.pixels[b]
+        h, w = mask.shape
+        padded = np.zeros((self.tiles_y * TILE, self.tiles_x * TILE), bool)
+        padded[:h, :w] = mask
+        tiles = padded.reshape(self.tiles_y, TILE, self.tiles_x, TILE).any(axis=(1, 3))
+        regions = []
+        seen = np.zeros_like(tiles)
+        for start in zip(*np.nonzero(tiles)):
+            if seen[start]:
+                continue
+            seen[start] = True
+            stack, comp = [start], []
+            while stack:
+                y, x = stack.pop()
+                comp.append((y, x))
+                for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                    if 0 <= ny < self.tiles_y and 0 <= nx < self.tiles_x and tiles[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+            ys, xs = zip(*comp)
+            y0, y1 = min(ys) * TILE, (max(ys) + 1) * TILE
+            x0, x1 = min(xs) * TILE, (max(xs) + 1) * TILE
+            sub = mask[y0:y1, x0:x1]
+            rows, cols = np.nonzero(sub.any(axis=1))[0], np.nonzero(sub.any(axis=0))[0]
+            regions.append(Area(Coord(x0 + cols[0], y0 + rows[0]), Coord(x0 + cols[-1] + 1, y0 + rows[-1] + 1)))
+        return regions
+
+def split_icons(region, max_dims=MAX_ICON_DIMS) -> list:
+    # Areas of at most max_dims covering region, in evenly sized pieces
+    (x0, y0), (w, h) = region.start, region.size()
+    nx, ny = -(-w // max_dims[0]), -(-h // max_dims[1])
+    xs = [x0 + w * i // nx for i in range(nx + 1)]
+    ys = [y0 + h * i // ny for i in range(ny + 1)]
+    return [Area(Coord(xs[i], ys[j]), Coord(xs[i + 1], ys[j + 1])) for j in range(ny) for i in range(nx)]
+
+def icons(regions) -> list:
+    return [a for r in regions for a in split_icons(r)]
+
+def icon_bytes(icons) -> int:
+    # pixels and an index entry per icon
+    return sum(a.size()[0] * a.size()[1] * 2 + ICON_ENTRY_SIZE for a in icons)
+
+class Report:
+    def __init__(self, basedir, threshold=SHARED_THRESHOLD) -> None:
+        by_size = defaultdict(list)
+        for f in sorted((Path(basedir) / 'DWIN_SET').glob('*.bmp')):
+            if re.match(r'\d{3}_', f.name):
+                px = bmp_pixels(f)
+                by_size[(px.shape[1], px.shape[0])].append(f)
+        self.sets = [PageSet(files, size) for size, files in sorted(by_size.items())]
+        self.threshold = threshold
+
+    @staticmethod
+    def duplicates(ps) -> list:
+        # [kept, duplicate, ...] groups of pixel-identical pages
+        groups = defaultdict(list)
+        for n, h in enumerate(ps.exact_hashes()):
+            groups[h].append(n)
+        return [g for g in groups.values() if len(g) > 1]
+
+    def identical(self):
+        # (page set, kept, [duplicates])
+        for ps in self.sets:
+            for g in self.duplicates(ps):
+                yield ps, ps.files[g[0]].name, ps.names(g[1:])
+
+    def similar(self):
+        # (page set, base, [(page, shared fraction, perceptual hash distance)])
+        for ps in self.sets:
+            shared = ps.shared()
+            phash = ps.perceptual_hashes()
+            distance = (phash[:, None, :] != phash[None, :, :]).sum(axis=2)
+            close = shared >= self.threshold
+            left = np.ones(len(ps.files), bool)
+            # exact copies are reported by identical(), only the kept page
+            # takes part here
+            for g in self.duplicates(ps):
+                left[g[1:]] = False
+            while True:
+                # the page most others are variants of stays a picture, its
+                # variants become icons over it
+                near = close & left & left[:, None]
+                if near.sum(axis=1).max() < 2:
+                    break
+                base = int((shared * near).sum(axis=1).argmax())
+                members = [n for n in np.nonzero(close[base] & left)[0] if n != base]
+                left[members + [base]] = False
+                yield ps, base, [(n, shared[base, n], distance[base, n]) for n in members]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('--threshold', type=float, default=SHARED_THRESHOLD,
+                        help='minimum fraction of shared tiles to treat pages as variants')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the differing regions')
+    args = parser.parse_args()
+
+    report = Report(args.basedir, args.threshold)
+    total = pages = 0
+    dup_total = dup_pages = 0
+    for ps, kept, dups in report.identical():
+        print(f'identical: {kept} = {", ".join(dups)}')
+        dup_pages += len(dups)
+        dup_total += len(dups) * ps.picture_bytes
+    for ps, base, members in report.similar():
+        print(f'{ps.files[base].name}:')
+        for n, shared, distance in members:
+            regions = ps.diff_regions(base, n)
+            parts = icons(regions)
+            cost = icon_bytes(parts)
+            saved = ps.picture_bytes - cost
+            print(f'  {ps.files[n].name}: {100 * shared:5.1f}% shared, phash distance {distance:2}, '
+                  f'{len(regions)} regions, {len(parts)} icons, {cost} bytes as icons', end='')
+            if saved > 0:
+                total += saved
+                pages += 1
+                print(f', saves {saved} bytes')
+            else:
+                print()
+            if args.verbose:
+                for a in parts:
+                    print(f'    {a}')
+    print(f'{dup_pages} pages are copies of another page, saving {dup_total // 1024} KB of flash')
+    print(f'{pages} pages could be drawn as icons over another page, saving {total // 1024} KB of flash')
@@ -0,0 +1,240 @@
+import argparse
+from collections import defaultdict
+from ctypes import *
+from fnmatch import fnmatch
+from pathlib import Path
+import subprocess
+from . import touch, display, iconlib
+from .common import Pic, PARSE_ERRORS
+
+PAGE_SIZE = 0x800
+SLOT_SIZE = 0x20
+
+class Blob:
+    __slots__ = ('name', 'id', '_load', '_data')
+
+    def __init__(self, name, id, load) -> None:
+        self.name = name
+        # git object id if known, lets identical files be skipped unread
+        self.id = id
+        self._load = load
+        self._data = None
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def same(self, other) -> bool:
+        if self.id is not None and other.id is not None:
+            return self.id == other.id
+        return self.data == other.data
+
+class DirSource:
+    def __init__(self, basedir) -> None:
+        self.dir = Path(basedir) / 'DWIN_SET'
+
+    def blobs(self, pattern) -> dict:
+        return {f.name: Blob(f.name, None, f.read_bytes) for f in sorted(self.dir.glob(pattern))}
+
+    def __str__(self) -> str:
+        return str(self.dir.parent)
+
+class GitSource:
+    def __init__(self, rev, basedir) -> None:
+        self.rev = rev
+        self.dir = Path(basedir)
+        out = subprocess.run(['git', '-C', str(self.dir), 'ls-tree', rev, 'DWIN_SET/'],
+                             check=True, capture_output=True, text=True).stdout
+        self.tree = {}
+        for line in out.splitlines():
+            meta, path = line.split('\t', 1)
+            self.tree[Path(path).name] = meta.split()[2]
+
+    def cat(self, id) -> bytes:
+        return subprocess.run(['git', '-C', str(self.dir), 'cat-file', 'blob', id],
+                              check=True, capture_output=True).stdout
+
+    def blobs(self, pattern) -> dict:
+        return {name: Blob(name, id, lambda id=id: self.cat(id))
+                for name, id in sorted(self.tree.items()) if fnmatch(name, pattern)}
+
+    def __str__(self) -> str:
+        return f'{self.rev}:{self.dir}'
+
+def make_source(spec: str):
+    # "REV:basedir" reads a git revision, anything else is a directory
+    if not Path(spec).exists() and ':' in spec:
+        rev, basedir = spec.split(':', 1)
+        return GitSource(rev, basedir or '.')
+    return DirSource(spec)
+
+def field_names(rec):
+    for cls in reversed(type(rec).__mro__):
+        for f in cls.__dict__.get('_fields_', ()):
+            yield f[0]
+
+def field_str(v) -> str:
+    if isinstance(v, Array):
+        return bytes(v).hex()
+    return str(v).strip()
+
+def diff_fields(a, b) -> list:
+    if a.__class__ is not b.__class__:
+        return [f'class {a.__class__.__name__} -> {b.__class__.__name__}']
+    changes = []
+    for name in field_names(a):
+        va, vb = field_str(getattr(a, name)), field_str(getattr(b, name))
+        if va != vb:
+            changes.append(f'{name} {va} -> {vb}')
+    return changes
+
+def diff_bytes(a, b) -> list:
+    # changed byte runs, for records that don't decode
+    changes = []
+    n = max(len(a), len(b))
+    off = 0
+    while off < n:
+        if a[off:off + 1] == b[off:off + 1]:
+            off += 1
+            continue
+        end = off
+        while end < n and a[end:end + 1] != b[end:end + 1]:
+            end += 1
+        changes.append(f'+0x{off:02x} {a[off:end].hex() or "-"} -> {b[off:end].hex() or "-"}')
+        off = end
+    return changes
+
+def display_records(page, pic) -> dict:
+    # (pic, type, vp) -> [(off, raw)], one entry per used slot of the page
+    records = defaultdict(list)
+    for off in range(0, len(page) - SLOT_SIZE + 1, SLOT_SIZE):
+        if 0x00 == page[off]:
+            continue
+        head = display.DisplayVariable.from_buffer_copy(page, off)
+        records[(pic, head.type, head.vp_word)].append((off, page[off:off + SLOT_SIZE]))
+    return records
+
+def decode_display(pic):
+    def decode(raw):
+        rec = display.Parser.make_class(raw, 0)
+        rec.pic = Pic(pic)
+        return rec
+    return decode
+
+def touch_records(buf) -> dict:
+    # (pic, vp) for controls, (pic, keycodes) for numpad/keyboard keys
+    records = defaultdict(list)
+    off = 0
+    while off + 2 < len(buf):
+        key = ('raw', off)
+        try:
+            head = touch.TouchArea.from_buffer_copy(buf, off)
+            key = (int(head.pic), 'raw', head.type, head.subtype)
+            cls = head.get_subclass()
+            if cls is touch.TouchControl:
+                ctl = touch.TouchControl.from_buffer_copy(buf, off)
+                key = (int(head.pic), 'vp', ctl.vp_word)
+                cls = ctl.get_subclass()
+            else:
+                key = (int(head.pic), 'key', head.type, head.subtype)
+            size = sizeof(cls)
+        except PARSE_ERRORS:
+            # compared byte by byte, skipped the way the parser does
+            size = touch.Parser.record_size(buf, off)
+        records[key].append((off, buf[off:off + size]))
+        off += size
+    return records
+
+def try_decode(decode, raw):
+    try:
+        return decode(raw)
+    except PARSE_ERRORS:
+        return None
+
+def diff_records(old, new, decode) -> list:
+    out = []
+    for key in sorted(old.keys() | new.keys(), key=str):
+        a, b = old.get(key, []), new.get(key, [])
+        for (aoff, araw), (boff, braw) in zip(a, b):
+            if araw == braw:
+                continue
+            ra, rb = try_decode(decode, araw), try_decode(decode, braw)
+            if ra is None or rb is None:
+                # one side doesn't parse, fall back to the raw slot
+                out.append(f'~ {rb or ra or key} @0x{boff:x}: ' + ', '.join(diff_bytes(araw, braw)))
+                continue
+            out.append(f'~ {rb}: ' + ', '.join(diff_fields(ra, rb) or ['reserved bytes changed']))
+        for off, raw in a[len(b):]:
+            out.append(f'- {try_decode(decode, raw) or f"{key} @0x{off:x} {raw.hex()}"}')
+        for off, raw in b[len(a):]:
+            out.append(f'+ {try_decode(decode, raw) or f"{key} @0x{off:x} {raw.hex()}"}')
+    return out
+
+def diff_display(old: bytes, new: bytes) -> list:
+    # compare whole pages first, only slots of changed pages get decoded
+    pages = max(len(old), len(new)) // PAGE_SIZE + 1
+    out = []
+    for pic in range(pages):
+        a = old[pic * PAGE_SIZE:(pic + 1) * PAGE_SIZE]
+        b = new[pic * PAGE_SIZE:(pic + 1) * PAGE_SIZE]
+        if a == b:
+            continue
+        out += diff_records(display_records(a, pic), display_records(b, pic), decode_display(pic))
+    return out
+
+def diff_touch(old: bytes, new: bytes) -> list:
+    decode = lambda raw: touch.Parser.make_class(raw, 0)
+    return diff_records(touch_records(old), touch_records(new), decode)
+
+def icon_spans(buf, icons) -> list:
+    # icon data isn't stored in index order, it ends where the next one starts
+    starts = sorted({i.data_offset for i in icons} | {len(buf)})
+    ends = {s: e for s, e in zip(starts, starts[1:])}
+    return [buf[i.data_offset:ends[i.data_offset]] for i in icons]
+
+def diff_iconlib(name, old: bytes, new: bytes) -> list:
+    a, b = iconlib.Parser.parse_icons(old), iconlib.Parser.parse_icons(new)
+    da, db = icon_spans(old, a), icon_spans(new, b)
+    out = []
+    for n, (ia, ib) in enumerate(zip(a, b)):
+        changes = [c for c in diff_fields(ia, ib) if not c.startswith('data_offset')]
+        if da[n] != db[n]:
+            changes.append('data changed')
+        if changes:
+            out.append(f'~ {name} icon {n}: ' + ', '.join(changes))
+    for n in range(len(b), len(a)):
+        out.append(f'- {name} icon {n}')
+    for n in range(len(a), len(b)):
+        out.append(f'+ {name} icon {n}')
+    return out
+
+def diff_files(old, new, pattern, fn, per_file=False) -> list:
+    a, b = old.blobs(pattern), new.blobs(pattern)
+    out = []
+    for name in sorted(a.keys() | b.keys()):
+        if name not in b:
+            out.append(f'- {name}')
+        elif name not in a:
+            out.append(f'+ {name}')
+        elif not a[name].same(b[name]):
+            out += fn(name, a[name].data, b[name].data) if per_file else fn(a[name].data, b[name].data)
+    return out
+
+def diff(old, new) -> list:
+    return [*diff_files(old, new, '14*.bin', diff_display),
+            *diff_files(old, new, '13*.bin', diff_touch),
+            *diff_files(old, new, '*.ico', diff_iconlib, per_file=True)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('old', help='basedir, or REV:basedir to read it from git')
+    parser.add_argument('new', nargs='?', default='../dgusm', help='basedir, or REV:basedir')
+    args = parser.parse_args()
+    old, new = make_source(args.old), make_source(args.new)
+    changes = diff(old, new)
+    for line in changes:
+        print(line)
+    print(f'{old} -> {new}: {len(changes)} changes')
@@ -5,6 +5,8 @@ from ctypes import *
 from .common import *
 
 class DisplayVariable(BigEndianStructure):
+    # derived attributes live in slots so records don't each carry a __dict__
+    __slots__ = ('vp', 'pic')
     _pack_ = 1
     _fields_ = [("valid", c_uint8),
                 ("type", c_uint8),
@@ -18,10 +20,13 @@ class DisplayVariable(BigEndianStructure):
         cls.type_map[cls.type_code] = cls
 
     def get_subclass(self) -> object:
-        return self.type_map[self.type]
+        try:
+            return self.type_map[self.type]
+        except KeyError:
+            raise ValueError(f'unknown display record type 0x{self.type:02x}') from None
 
     def __new__(cls, buf, off):
-        return cls.from_buffer(buf, off)
+        return cls.from_buffer_copy(buf, off)
 
     def __init__(self, buf, off) -> None:
         assert self.valid == 0x5a, f'bad magic: 0x{self.valid:02x} off 0x{off:x}'
@@ -36,6 +41,7 @@ class DisplayVariable(BigEndianStructure):
 
 class Icon(DisplayVariable):
     type_code = 0x00
+    __slots__ = ('area',)
     _pack_ = 1
     _fields_ = [("pos", Coord),
                 ("val_min", c_uint16),
@@ -54,6 +60,7 @@ class Icon(DisplayVariable):
 
 class ImageAnimation(DisplayVariable):
     type_code = 0x04
+    __slots__ = ()
     _pack_ = 1
     _fields_ = [("pic_begin", Pic),
                 ("pic_end", Pic),
@@ -74,6 +81,7 @@ class ImageAnimation(DisplayVariable):
 
 class Slider(DisplayVariable):
     type_code = 0x02
+    __slots__ = ('pos', 'end', 'area')
     _pack_ = 1
     _fields_ = [("val_min", c_uint16),
                 ("val_max", c_uint16),
@@ -106,6 +114,7 @@ class Slider(DisplayVariable):
 
 class BitIcon(DisplayVariable):
     type_code = 0x06
+    __slots__ = ('area', 'ap')
     _pack_ = 1
     _fields_ = [("vp_aux_ptr_word", c_uint16), # also called AP, 2 words
                 ("bitmask", c_uint16),
@@ -145,6 +154,7 @@ class BitIcon(DisplayVariable):
 
 class Numeric(DisplayVariable):
     type_code = 0x10
+    __slots__ = ('suffix', 'y_px', 'area')
     _pack_ = 1
     _fields_ = [("text_pos", Coord),
                 ("color", Color),
@@ -182,6 +192,7 @@ class Numeric(DisplayVariable):
 
 class Text(DisplayVariable):
     type_code = 0x11
+    __slots__ = ()
     _pack_ = 1
     _fields_ = [("text_pos", Coord),
                 ("color", Color),
@@ -211,6 +222,7 @@ class Text(DisplayVariable):
 
 class Curve(DisplayVariable):
     type_code = 0x20
+    __slots__ = ('y_scale',)
     _pack_ = 1
     _fields_ = [("area", Area),
                 ("y_center", Position),
@@ -244,16 +256,29 @@ class Parser:
                 return touch
             touch = t(mm, off)
 
-    def __init__(self, dirname):
+    def __init__(self, dirname, strict=True):
         d = Path(dirname) / 'DWIN_SET'
-        filename = next(d.glob('14*.bin'))
-
-        with open(filename, 'r+b') as f:
-            # cannot be read-only if we want to use the buffer directly
-            #mm = mmap(f.fileno(), 0, access=ACCESS_READ)
-            self.mm = mmap(f.fileno(), 0)
+        self.filename = next(d.glob('14*.bin'), None)
+        if self.filename is None:
+            raise FileNotFoundError(f'no 14*.bin in {d}')
+        # not strict: bad records become diagnostics and parsing goes on
+        self.strict = strict
+        self.diagnostics = []
+
+        with open(self.filename, 'rb') as f:
+            # records are copied out, so they don't pin the mapping
+            self.mm = map_file(f, self.strict, self.diagnostics, self.filename)
             # print(filename, 'len', len(self.mm))
 
+    @classmethod
+    def from_buffer(cls, buf, strict=True, filename='<buffer>'):
+        self = cls.__new__(cls)
+        self.filename = filename
+        self.strict = strict
+        self.diagnostics = []
+        self.mm = buf
+        return self
+
     def __iter__(self):
         off = 0
         while off < len(self.mm):
@@ -261,7 +286,15 @@ class Parser:
                 off += 0x20
                 continue
             # print('off: {:04x}'.format(off))
-            t = self.make_class(self.mm, off)
+            try:
+                t = self.make_class(self.mm, off)
+            except PARSE_ERRORS as e:
+                if self.strict:
+                    raise
+                self.diagnostics.append(Diagnostic(self.filename, off, e))
+                # records sit on 0x20 boundaries, resume at the next one
+                off += 0x20
+                continue
             off += sizeof(t)
             yield t
 
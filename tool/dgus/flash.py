@@ -0,0 +1,123 @@
+import argparse
+from pathlib import Path
+import re
+import struct
+
+SECTOR_SIZE = 256 * 1024
+FLASH_SLOTS = 64
+PICTURE_SLOTS = 374
+# numbered files the DGUS OS copies to font space by their ID. Audio and
+# .lib files live elsewhere and are not mapped.
+ASSET_SUFFIXES = ('.hzk', '.dzk', '.ico', '.icl', '.bin')
+# rough SD card upgrade speed, for estimates only
+FLASH_RATE = 100 * 1024
+
+class Allocation:
+    __slots__ = ('name', 'first', 'size')
+
+    def __init__(self, name, first, size) -> None:
+        self.name = name
+        self.first = first
+        self.size = size
+
+    @property
+    def sectors(self) -> int:
+        return max(1, -(-self.size // SECTOR_SIZE))
+
+    @property
+    def last(self) -> int:
+        return self.first + self.sectors - 1
+
+    def __str__(self) -> str:
+        return '{:3}-{:<3} {:8} bytes {:2} sectors {}'.format(
+            self.first, self.last, self.size, self.sectors, self.name)
+
+def bmp_size(filename) -> int:
+    # pictures are stored as RGB565
+    with open(filename, 'rb') as f:
+        header = f.read(26)
+    width, height = struct.unpack_from('<ii', header, 18)
+    return width * abs(height) * 2
+
+class FlashMap:
+    def __init__(self, basedir, slots=FLASH_SLOTS, picture_slots=PICTURE_SLOTS) -> None:
+        d = Path(basedir) / 'DWIN_SET'
+        self.slots = slots
+        self.picture_slots = picture_slots
+        self.assets = []
+        self.pictures = []
+        for f in sorted(d.iterdir()):
+            m = re.match(r'(\d+)', f.name)
+            if not m:
+                continue
+            if f.suffix.lower() == '.bmp':
+                self.pictures.append(Allocation(f.name, int(m.group(1)), bmp_size(f)))
+            elif f.suffix.lower() in ASSET_SUFFIXES:
+                self.assets.append(Allocation(f.name, int(m.group(1)), f.stat().st_size))
+        self.assets.sort(key=lambda a: a.first)
+        self.pictures.sort(key=lambda a: a.first)
+
+    @staticmethod
+    def collisions(allocs) -> list:
+        # allocs sorted by first slot: sweep, remembering the furthest reach
+        out = []
+        reach = None
+        for a in allocs:
+            if reach is not None and a.first <= reach.last:
+                out.append((reach, a))
+            if reach is None or a.last > reach.last:
+                reach = a
+        return out
+
+    def asset_collisions(self) -> list:
+        return self.collisions(self.assets)
+
+    def picture_collisions(self) -> list:
+        return self.collisions(self.pictures)
+
+    def overflows(self) -> list:
+        return [a for a in self.assets if a.last >= self.slots] + \
+            [p for p in self.pictures if p.first >= self.picture_slots or p.sectors > 1]
+
+    def free(self) -> list:
+        # (first, last) runs of unused font space slots
+        used = [False] * self.slots
+        for a in self.assets:
+            for s in range(a.first, min(a.last + 1, self.slots)):
+                used[s] = True
+        runs = []
+        for s, u in enumerate(used):
+            if u:
+                continue
+            if runs and runs[-1][1] == s - 1:
+                runs[-1][1] = s
+            else:
+                runs.append([s, s])
+        return [tuple(r) for r in runs]
+
+    def flash_bytes(self) -> int:
+        return sum(a.size for a in [*self.assets, *self.pictures])
+
+    def flash_time(self, rate=FLASH_RATE) -> float:
+        return self.flash_bytes() / rate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('--slots', type=int, default=FLASH_SLOTS, help='font space size in 256KB sectors')
+    parser.add_argument('--rate', type=float, default=FLASH_RATE / 1024, help='SD card upgrade speed in KB/s')
+    args = parser.parse_args()
+    fm = FlashMap(args.basedir, args.slots)
+    print('font space:')
+    for a in fm.assets:
+        print('  ', a)
+    print(f'pictures: {len(fm.pictures)} of {fm.picture_slots} slots')
+    for a, b in [*fm.asset_collisions(), *fm.picture_collisions()]:
+        print(f'COLLISION: [{a}] <=> [{b}]')
+    for a in fm.overflows():
+        print(f'OVERFLOW: [{a}]')
+    free = fm.free()
+    print('free slots:', ', '.join(f'{a}-{b}' if a != b else f'{a}' for a, b in free),
+          f'({sum(b - a + 1 for a, b in free) * SECTOR_SIZE // 1024} KB)')
+    print(f'estimated flash time: {fm.flash_time(args.rate * 1024):.0f}s for {fm.flash_bytes()} bytes')
@@ -0,0 +1,134 @@
+import argparse
+import json
+from pathlib import Path
+from . import touch
+from .common import VP, VP_Type, RAM_SIZE
+from .project import Project, FakeApControl
+
+# host side VP definitions, JSON or YAML:
+#
+#   status_text: {addr: 0x0014, type: text, length: 32}
+#   home_flags:  {addr: 0x0036, type: word}
+#   fan_on:      {addr: 0x0037, type: bit, bit: 4}
+#   z_offset:    {addr: 0x0300, type: dword}
+#   numpad_in:   {addr: 0x0410, type: word, access: read}
+#
+# addr is the word address the host uses on the wire. access is 'write'
+# (default, host -> panel) or 'read' (panel -> host, i.e. touch input).
+TYPES = {
+    'bit': VP_Type.BIT,
+    'byte': VP_Type.BYTE,
+    'word': VP_Type.WORD,
+    'dword': VP_Type.DWORD,
+    'qword': VP_Type.QWORD,
+    'text': VP_Type.TEXT,
+}
+ACCESS = ('write', 'read')
+
+class HostVP:
+    __slots__ = ('name', 'vp', 'access')
+
+    def __init__(self, name, d) -> None:
+        self.name = name
+        if not isinstance(d, dict) or 'addr' not in d:
+            raise ValueError(f'host VP {name}: needs an addr')
+        addr = d['addr']
+        try:
+            addr = int(addr, 0) if isinstance(addr, str) else int(addr)
+        except (TypeError, ValueError):
+            raise ValueError(f'host VP {name}: bad addr {addr!r}') from None
+        t = TYPES.get(str(d.get('type', 'word')).lower())
+        if t is None:
+            raise ValueError(f'host VP {name}: type must be one of {tuple(TYPES)}')
+        length, bit = d.get('length'), d.get('bit')
+        if t == VP_Type.TEXT and not (isinstance(length, int) and length > 0):
+            raise ValueError(f'host VP {name}: text needs a length in bytes')
+        if t == VP_Type.BIT and not (isinstance(bit, int) and bit in range(16)):
+            raise ValueError(f'host VP {name}: bit needs a bit number 0-15')
+        self.vp = VP(addr)
+        self.vp.set_type(t, bit=bit, len=length, low_byte=d.get('low_byte'))
+        self.access = d.get('access', 'write')
+        if self.access not in ACCESS:
+            raise ValueError(f'host VP {name}: access must be one of {ACCESS}')
+
+    def __str__(self) -> str:
+        return 'host {} {} ({})'.format(self.name, self.vp, self.access)
+
+def load(filename: Path) -> list:
+    text = Path(filename).read_text()
+    if Path(filename).suffix.lower() in ('.yaml', '.yml'):
+        import yaml
+        defs = yaml.safe_load(text)
+    else:
+        defs = json.loads(text)
+    return [HostVP(name, d) for name, d in (defs or {}).items()]
+
+def same_vp(a, b) -> bool:
+    return (a.type, a.addr, a.size) == (b.type, b.addr, b.size) and \
+        (a.type != VP_Type.BIT or a.bit == b.bit)
+
+def covers(host, vp) -> bool:
+    # a host word/byte write also updates the bits and bytes inside it
+    return vp.type in (VP_Type.BIT, VP_Type.BYTE) and host.type != VP_Type.TEXT and \
+        host.addr <= vp.addr and vp.end <= host.end
+
+def vp_key(vp):
+    return (vp.addr, vp.type, vp.size, getattr(vp, 'bit', None))
+
+class Crosscheck:
+    def __init__(self, project, hostvps) -> None:
+        self.hostvps = hostvps
+        # panel VPs by every byte they use: one pass over each list, no
+        # pairwise comparison
+        self.panel = [c for c in project.ramlist if not isinstance(c, FakeApControl)]
+        self.by_byte = [[] for _ in range(RAM_SIZE)]
+        for c in self.panel:
+            for b in range(c.vp.addr, min(c.vp.end, RAM_SIZE)):
+                self.by_byte[b].append(c)
+
+    def overlapping(self, vp) -> list:
+        seen = {}
+        for b in range(vp.addr, min(vp.end, RAM_SIZE)):
+            for c in self.by_byte[b]:
+                seen[id(c)] = c
+        return list(seen.values())
+
+    def run(self):
+        # (mismatches, unused host VPs, panel VPs the host never touches)
+        mismatches = {}
+        unused = []
+        handled = set()
+        for h in self.hostvps:
+            panel_writes = h.access == 'read'
+            used = False
+            for c in self.overlapping(h.vp):
+                if isinstance(c, touch.TouchControl) != panel_writes:
+                    continue
+                used = True
+                if same_vp(h.vp, c.vp) or covers(h.vp, c.vp):
+                    handled.add(id(c))
+                else:
+                    mismatches.setdefault((h.name, vp_key(c.vp)), (h, c))
+            if not used:
+                unused.append(h)
+        # one entry per VP, the same VP usually shows up on several pages
+        missing = {}
+        for c in self.panel:
+            if id(c) not in handled:
+                missing.setdefault(vp_key(c.vp), c)
+        return list(mismatches.values()), unused, list(missing.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('hostvps', type=Path, help='host VP definitions (.json or .yaml)')
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    args = parser.parse_args()
+    mismatches, unused, missing = Crosscheck(Project(args.basedir), load(args.hostvps)).run()
+    for h, c in mismatches:
+        print(f'MISMATCH: [{h}] <=> [{c}]')
+    for h in unused:
+        print(f'UNUSED: [{h}] no control on the panel uses it')
+    for c in missing:
+        side = 'reads' if isinstance(c, touch.TouchControl) else 'writes'
+        print(f'MISSING: the host never {side} [{c}]')
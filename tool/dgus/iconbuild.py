@@ -0,0 +1,140 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from ctypes import sizeof
+import hashlib
+from io import BytesIO
+from pathlib import Path
+import re
+import sys
+import numpy as np
+from PIL import Image
+from .iconlib import Icon
+
+INDEX_SIZE = 256 * 1024
+# bump when the encoding changes so cached icons get rebuilt
+ENCODER_VERSION = 1
+
+def encode(data: bytes, transparency: int):
+    # big endian RGB565, the DGUS tool truncates rather than rounds
+    img = Image.open(BytesIO(data)).convert('RGBA')
+    a = np.asarray(img).astype(np.uint16)
+    px = (a[..., 0] >> 3) << 11 | (a[..., 1] >> 2) << 5 | a[..., 2] >> 3
+    px[a[..., 3] < 0x80] = transparency
+    return img.size, px.astype('>u2').tobytes()
+
+def encode_file(args):
+    filename, transparency = args
+    return encode(Path(filename).read_bytes(), transparency)
+
+def index_entry(size, offset, transparency) -> bytes:
+    e = Icon.from_buffer_copy(bytes(sizeof(Icon)))
+    e.x_0, e.x_8 = size[0] & 0xff, size[0] >> 8
+    e.y_0, e.y_8 = size[1] & 0xff, size[1] >> 8
+    # in 16-bit words from the start of the file
+    e.data_offset = offset // 2
+    e.transparency.value = transparency
+    return bytes(e)
+
+def sources(srcdir: Path) -> list:
+    # icon N comes from N.png (or N.bmp), ids must be contiguous from 0
+    files = {}
+    for f in srcdir.iterdir():
+        if f.suffix.lower() in ('.png', '.bmp') and re.fullmatch(r'\d+', f.stem):
+            files[int(f.stem)] = f
+    assert sorted(files) == list(range(len(files))), f'icon ids in {srcdir} are not contiguous from 0'
+    return [files[i] for i in range(len(files))]
+
+class Builder:
+    def __init__(self, cachedir: Path, transparency=0x0000, jobs=None) -> None:
+        self.cachedir = cachedir
+        self.transparency = transparency
+        self.jobs = jobs
+        self.stats = {'encoded': 0, 'cached': 0, 'shared': 0}
+
+    def cache_path(self, digest) -> Path:
+        return self.cachedir / f'{digest}.bin'
+
+    def load(self, files) -> list:
+        # (size, pixels) per file, encoding only what isn't cached yet
+        digests = []
+        for f in files:
+            h = hashlib.sha1(f.read_bytes())
+            h.update(f'{ENCODER_VERSION}:{self.transparency}'.encode())
+            digests.append(h.hexdigest())
+
+        out = [None] * len(files)
+        missing = []
+        for n, d in enumerate(digests):
+            p = self.cache_path(d)
+            if p.exists():
+                raw = p.read_bytes()
+                out[n] = ((int.from_bytes(raw[0:2], 'big'), int.from_bytes(raw[2:4], 'big')), raw[4:])
+                self.stats['cached'] += 1
+            else:
+                missing.append(n)
+
+        if missing:
+            self.cachedir.mkdir(parents=True, exist_ok=True)
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                work = [(str(files[n]), self.transparency) for n in missing]
+                for n, (size, px) in zip(missing, pool.map(encode_file, work, chunksize=8)):
+                    out[n] = (size, px)
+                    header = size[0].to_bytes(2, 'big') + size[1].to_bytes(2, 'big')
+                    self.cache_path(digests[n]).write_bytes(header + px)
+                    self.stats['encoded'] += 1
+        return out
+
+    def build(self, srcdir: Path) -> bytes:
+        icons = self.load(sources(srcdir))
+        assert len(icons) * sizeof(Icon) <= INDEX_SIZE, f'too many icons in {srcdir}'
+        index = bytearray(INDEX_SIZE)
+        data = bytearray()
+        # identical icons point at the same pixel data. Data is laid out in
+        # file name order (0, 1, 10, 11, ...) like the DGUS tool does.
+        placed = {}
+        for n in sorted(range(len(icons)), key=str):
+            size, px = icons[n]
+            offset = placed.get(px)
+            if offset is None:
+                offset = INDEX_SIZE + len(data)
+                placed[px] = offset
+                data += px
+            else:
+                self.stats['shared'] += 1
+            entry = index_entry(size, offset, self.transparency)
+            index[n * len(entry):(n + 1) * len(entry)] = entry
+        return bytes(index + data)
+
+def libraries(basedir: Path) -> list:
+    # NN_name/ source folders next to DWIN_SET
+    return sorted(d for d in basedir.iterdir() if d.is_dir() and re.fullmatch(r'\d+_.+', d.name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('--lib', action='append', help='only build these NN_name libraries')
+    parser.add_argument('--cache', type=Path, help='encoded icon cache (default: BASEDIR/.iconcache)')
+    parser.add_argument('--transparency', type=lambda x: int(x, 0), default=0x0000,
+                        help='RGB565 color written for transparent pixels')
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    parser.add_argument('--check', action='store_true', help="don't write, fail if any .ico is stale")
+    args = parser.parse_args()
+
+    builder = Builder(args.cache or args.basedir / '.iconcache', args.transparency, args.jobs)
+    stale = 0
+    for src in libraries(args.basedir):
+        if args.lib and src.name not in args.lib:
+            continue
+        out = args.basedir / 'DWIN_SET' / f'{src.name}.ico'
+        ico = builder.build(src)
+        current = out.read_bytes() if out.exists() else None
+        status = 'unchanged' if ico == current else 'stale' if args.check else 'written'
+        if ico != current:
+            stale += 1
+            if not args.check:
+                out.write_bytes(ico)
+        print(f'{out.name}: {len(ico)} bytes {status}')
+    print(', '.join(f'{k} {v}' for k, v in builder.stats.items()))
+    if args.check and stale:
+        sys.exit(1)
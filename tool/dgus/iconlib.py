@@ -1,11 +1,18 @@
 import argparse
+import hashlib
 from mmap import *
 from pathlib import Path
 from ctypes import *
 import re
 from .common import *
 
+# the icon index, the image data follows it
+INDEX_SIZE = 256*1024
+# largest icon the panel draws
+MAX_ICON_DIMS = (255, 255)
+
 class Icon(BigEndianStructure):
+    __slots__ = ('id', 'size')
     _pack_ = 1
     _fields_ = [("x_0", c_uint8),
                 ("y_0", c_uint8),
@@ -18,7 +25,7 @@ class Icon(BigEndianStructure):
         return self.data_offset != 0
 
     def __new__(cls, buf, off):
-        return cls.from_buffer(buf, off)
+        return cls.from_buffer_copy(buf, off)
 
     def __init__(self, buf, off) -> None:
         assert sizeof(self) == 0x8
@@ -31,6 +38,8 @@ class Icon(BigEndianStructure):
         return '{:3}: {} transparency {}'.format(self.id, self.size, self.transparency)
 
 class IconLib:
+    __slots__ = ('id', 'name', 'icons')
+
     def __init__(self, filename : Path) -> None:
         m = re.fullmatch(r'(\d+)_(.+)', filename.stem)
         self.id = int(m.group(1))
@@ -41,23 +50,68 @@ class IconLib:
         return 'iconlib {} (\'{}\' {} icons)'.format(self.id, self.name, len(self.icons))
 
 class Parser:
-    def __init__(self, dirname):
+    # icon tables of libraries with the same index, shared between projects
+    # parsed by the same process (e.g. language variants of one printer).
+    # Only the used part of the index is hashed, all of the file costs more
+    # than parsing it.
+    cache = {}
+
+    def __init__(self, dirname, strict=True):
         d = Path(dirname) / 'DWIN_SET'
         self.files = d.glob('*.ico')
+        # not strict: bad icon tables become diagnostics and parsing goes on
+        self.strict = strict
+        self.diagnostics = []
+
+    @staticmethod
+    def parse_icons(mm, diagnostics=None, filename='<buffer>') -> list:
+        # strict unless there's a diagnostics list to add failures to
+        icons = []
+        off = 0
+        while off < min(len(mm), INDEX_SIZE):
+            try:
+                t = Icon(mm, off)
+            except PARSE_ERRORS as e:
+                if diagnostics is None:
+                    raise
+                # a truncated table, nothing after it is usable
+                diagnostics.append(Diagnostic(filename, off, e))
+                break
+            if not t.is_valid():
+                break
+            off += sizeof(t)
+            icons.append(t)
+        return icons
+
+    @staticmethod
+    def index_key(mm) -> bytes:
+        # the index up to its first empty entry, which is all parse_icons()
+        # can read before it stops
+        end = min(len(mm), INDEX_SIZE)
+        off = mm.find(bytes(sizeof(Icon)), 0, end)
+        while off >= 0 and off % sizeof(Icon):
+            off = mm.find(bytes(sizeof(Icon)), off + 1, end)
+        if off >= 0:
+            end = off
+        return hashlib.sha1(mm[:end]).digest() + end.to_bytes(4, 'big')
 
     def __iter__(self):
         for filename in self.files:
-            with open(filename, 'r+b') as f:
-                mm = mmap(f.fileno(), 0)
+            with open(filename, 'rb') as f:
+                mm = mmap(f.fileno(), 0, access=ACCESS_READ)
                 lib = IconLib(filename)
 
-                off = 0
-                while off < min(len(mm), 256*1024):
-                    t = Icon(mm, off)
-                    if not t.is_valid():
-                        break
-                    off += sizeof(t)
-                    lib.icons.append(t)
+                key = self.index_key(mm)
+                icons = self.cache.get(key)
+                if icons is None:
+                    diagnostics = None if self.strict else []
+                    icons = self.parse_icons(mm, diagnostics, filename)
+                    if diagnostics:
+                        # only clean tables are shared, every bad copy reports itself
+                        self.diagnostics += diagnostics
+                    else:
+                        self.cache[key] = icons
+                lib.icons = icons
 
                 yield lib
 
@@ -1,12 +1,17 @@
 import argparse
 from pathlib import Path
+import struct
+import numpy as np
 from PIL import Image
 from .common import *
 
 class Page:
+    __slots__ = ('pic', 'name', 'size', 'filename')
+
     def __init__(self, filename : Path) -> None:
         self.pic = Pic(int(filename.stem[:3]))
         self.name = filename.stem[4:]
+        self.filename = filename
         img = Image.open(filename)
         assert img.format == 'BMP'
         assert img.mode == 'RGB'
@@ -16,6 +21,24 @@ class Page:
     def __str__(self) -> str:
         return '{} \'{}\' {}'.format(self.pic, self.name, self.size)
 
+def bmp_pixels(filename) -> np.ndarray:
+    # (height, width, 3) RGB view of an uncompressed 24-bit BMP, memory
+    # mapped and flipped to top-down rows without copying
+    with open(filename, 'rb') as f:
+        header = f.read(54)
+    offset, = struct.unpack_from('<I', header, 10)
+    width, height, planes, bpp, compression = struct.unpack_from('<iiHHI', header, 18)
+    assert bpp == 24 and compression == 0, f'{filename}: not a 24-bit BI_RGB bitmap'
+    stride = (width * 3 + 3) & ~3
+    raw = np.memmap(filename, np.uint8, 'r', offset, (abs(height), stride))
+    px = raw[:, :width * 3].reshape(abs(height), width, 3)[:, :, ::-1]
+    return px[::-1] if height > 0 else px
+
+def rgb565(px: np.ndarray) -> np.ndarray:
+    # what actually ends up in flash, truncated like the DGUS tool does
+    px = px.astype(np.uint16)
+    return (px[..., 0] >> 3) << 11 | (px[..., 1] >> 2) << 5 | px[..., 2] >> 3
+
 class Parser:
     def __init__(self, dirname):
         d = Path(dirname) / 'DWIN_SET'
@@ -0,0 +1,101 @@
+import argparse
+import bisect
+from collections import defaultdict
+from pathlib import Path
+from . import touch, display, iconlib, pages as dpages
+
+class FakeApControl:
+    __slots__ = ('control', 'pic', 'vp')
+
+    def __init__(self, control) -> None:
+        self.control = control
+        self.pic = control.pic
+        self.vp = control.ap
+
+    def __str__(self) -> str:
+        return f'AUX_PTR of [{self.control}]'
+
+class Project:
+    def __init__(self, basedir, strict=True) -> None:
+        self.basedir = Path(basedir)
+        # not strict: records that fail to parse are skipped and described
+        # in diagnostics instead of aborting
+        self.strict = strict
+        self.diagnostics = []
+        self.tcontrols = self.parse(touch.Parser(self.basedir, strict))
+        self.dcontrols = self.parse(display.Parser(self.basedir, strict))
+        self.pages = {}
+        self.iconlibs = {}
+        self.ramlist = []
+        self.populate_pages()
+        self.populate_icons()
+        self.populate_ram()
+        self.build_indexes()
+
+    def parse(self, parser) -> list:
+        records = list(parser)
+        self.diagnostics += parser.diagnostics
+        return records
+
+    def populate_pages(self):
+        for p in dpages.Parser(self.basedir):
+            self.pages[int(p.pic)] = p
+
+    def populate_icons(self):
+        parser = iconlib.Parser(self.basedir, self.strict)
+        for i in parser:
+            self.iconlibs[i.id] = i
+        self.diagnostics += parser.diagnostics
+
+    def populate_ram(self):
+        aux_ptrs = []
+        for c in self.dcontrols:
+            if not hasattr(c, 'ap'):
+                continue
+            aux_ptrs.append(FakeApControl(c))
+
+        for c in [*self.dcontrols, *self.tcontrols, *aux_ptrs]:
+            if not hasattr(c, 'vp') or c.vp.size == 0:
+                continue
+            self.ramlist.append(c)
+
+        self.ramlist.sort(key=lambda c: c.vp.addr)
+
+    def build_indexes(self):
+        self.by_pic = defaultdict(list)
+        self.by_class = defaultdict(list)
+        for c in self.controls():
+            self.by_pic[int(c.pic)].append(c)
+            self.by_class[c.__class__].append(c)
+
+        # ramlist is sorted by address, so ranges can be found by bisection
+        self.ram_addrs = [c.vp.addr for c in self.ramlist]
+        self.max_vp_size = max((c.vp.size for c in self.ramlist), default=0)
+
+    def controls(self):
+        return [*self.dcontrols, *self.tcontrols]
+
+    def of_class(self, *classes) -> list:
+        return [c for cls, cs in self.by_class.items() if issubclass(cls, classes) for c in cs]
+
+    def with_attr(self, attr) -> list:
+        # fields and slots are declared per class, no need to look at each record
+        return [c for cls, cs in self.by_class.items() if hasattr(cls, attr) for c in cs]
+
+    def vp_range(self, start, end) -> list:
+        # every ramlist entry whose VP overlaps [start, end)
+        lo = bisect.bisect_left(self.ram_addrs, start - self.max_vp_size + 1)
+        hi = bisect.bisect_left(self.ram_addrs, end)
+        return [c for c in self.ramlist[lo:hi] if c.vp.end > start]
+
+    def __str__(self) -> str:
+        return 'project \'{}\' ({} display, {} touch, {} pages, {} iconlibs)'.format(
+            self.basedir, len(self.dcontrols), len(self.tcontrols),
+            len(self.pages), len(self.iconlibs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    args = parser.parse_args()
+    print(Project(args.basedir))
@@ -0,0 +1,77 @@
+from collections import Counter
+import runpy
+
+ERROR = 'error'
+WARNING = 'warning'
+
+class Rule:
+    __slots__ = ('name', 'types', 'fields', 'fn', 'level')
+
+    def __init__(self, name, types, fields, fn, level) -> None:
+        self.name = name
+        self.types = types
+        self.fields = fields
+        self.fn = fn
+        self.level = level
+
+    def bind(self, cls):
+        # fields this rule reads from records of cls, or None if it doesn't apply
+        if self.types and not issubclass(cls, self.types):
+            return None
+        if not self.fields:
+            return ()
+        fields = tuple(f for f in self.fields if hasattr(cls, f))
+        return fields or None
+
+    def __str__(self) -> str:
+        return '{} ({})'.format(self.name, self.level)
+
+class RuleSet:
+    def __init__(self) -> None:
+        self.rules = []
+        self.dispatch = {}
+        self.loaded = set()
+
+    def add(self, rule: Rule):
+        self.rules.append(rule)
+        self.dispatch.clear()
+
+    # decorates a generator fn(project, record, field, value) yielding one
+    # message per violation. With fields, it is called for each of them the
+    # record's class declares, otherwise once with the record as value.
+    def rule(self, name, types=(), fields=(), level=ERROR):
+        def decorator(fn):
+            self.add(Rule(name, types, tuple(fields), fn, level))
+            return fn
+        return decorator
+
+    def load(self, filename):
+        # project-specific rules: a python file registering on `rules`
+        if filename in self.loaded:
+            return
+        runpy.run_path(str(filename), init_globals={'rules': self})
+        self.loaded.add(filename)
+
+    def compile(self, cls) -> list:
+        bound = self.dispatch.get(cls)
+        if bound is None:
+            bound = []
+            for r in self.rules:
+                fields = r.bind(cls)
+                if fields is not None:
+                    bound.append((r, fields))
+            self.dispatch[cls] = bound
+        return bound
+
+    def run(self, project, records, report) -> Counter:
+        fired = Counter()
+        for rec in records:
+            for r, fields in self.compile(rec.__class__):
+                if fields:
+                    msgs = [m for f in fields for m in r.fn(project, rec, f, getattr(rec, f))]
+                else:
+                    msgs = list(r.fn(project, rec, None, rec))
+                for m in msgs:
+                    report(r.level, m)
+                fired[r.name] += len(msgs)
+        return +fired
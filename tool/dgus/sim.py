@@ -0,0 +1,267 @@
+import argparse
+from collections import Counter
+import json
+import os
+from pathlib import Path
+import random
+import select
+import time
+import tty
+from . import config, touch
+from .config import CMD_WRITE_REG, CMD_READ_REG, CMD_WRITE_VP, CMD_READ_VP
+from .common import VP_Type, VPRam, RAM_SIZE
+from .project import Project
+
+REG_PIC_ID = 0x03 # Mini DGUS: 2 bytes, big endian
+VP_PIC_SET = 0x84 * 2 # T5UID1: write 0x5a01, page to switch pages
+
+class Stats:
+    def __init__(self) -> None:
+        self.count = Counter()
+        self.max_backlog = 0.0
+
+    def __str__(self) -> str:
+        items = ' '.join(f'{k}={v}' for k, v in sorted(self.count.items()))
+        return f'{items} max_backlog_ms={self.max_backlog * 1000:.1f}'
+
+class Simulator:
+    def __init__(self, project: Project, timing=None, *, ack=False, refresh=0.04, page=0) -> None:
+        self.project = project
+        # line speed from the project's CONFIG.txt unless given
+        self.timing = timing or config.timing(project.basedir)
+        self.byte_time = self.timing.byte_time
+        self.ack = ack
+        self.refresh = refresh
+        self.ram = config.initial_ram(project.basedir) or VPRam()
+        self.regs = bytearray(256)
+        self.page = page
+        self.rx = bytearray()
+        # when the last received / sent byte is on the wire at the configured baud
+        self.rx_busy = 0.0
+        self.tx_busy = 0.0
+        self.txq = []
+        self.last_write = {}
+        self.stats = Stats()
+        # VP write trace (json lines), for replaying host traffic offline
+        self.record = None
+
+    ### host -> display ###
+
+    def feed(self, data, now):
+        self.stats.count['bytes_rx'] += len(data)
+        # the host may burst faster than the line rate, model the queueing
+        self.rx_busy = max(self.rx_busy, now) + len(data) * self.byte_time
+        self.stats.max_backlog = max(self.stats.max_backlog, self.rx_busy - now)
+        self.rx += data
+        while True:
+            start = self.rx.find(self.timing.header)
+            if start < 0:
+                # keep a trailing 0x5a, it may start the next header
+                if len(self.rx) > 1:
+                    self.stats.count['bad_bytes'] += len(self.rx) - 1
+                    del self.rx[:-1]
+                return
+            if start:
+                self.stats.count['bad_bytes'] += start
+                del self.rx[:start]
+            if len(self.rx) < 3 or len(self.rx) < 3 + self.rx[2]:
+                return
+            body = bytes(self.rx[3:3 + self.rx[2]])
+            del self.rx[:3 + len(body)]
+            frame = self.timing.unframe(body)
+            if frame is None:
+                self.stats.count['bad_crc'] += 1
+                continue
+            self.handle(frame)
+
+    def handle(self, frame):
+        self.stats.count['frames_rx'] += 1
+        if not frame:
+            self.stats.count['bad_frames'] += 1
+            return
+        cmd, body = frame[0], frame[1:]
+        if CMD_WRITE_VP == cmd and len(body) >= 2:
+            self.write_vp(int.from_bytes(body[:2], 'big') * 2, body[2:])
+        elif CMD_READ_VP == cmd and len(body) == 3:
+            addr, words = int.from_bytes(body[:2], 'big'), body[2]
+            self.send(bytes([CMD_READ_VP]) + body + self.read_words(addr * 2, words))
+        elif CMD_WRITE_REG == cmd and len(body) >= 1:
+            self.write_reg(body[0], body[1:])
+        elif CMD_READ_REG == cmd and len(body) == 2:
+            addr, n = body
+            self.send(bytes([CMD_READ_REG, addr, n]) + self.regs[addr:addr + n])
+        else:
+            self.stats.count['bad_frames'] += 1
+
+    def read_words(self, addr, words):
+        if addr + words * 2 > RAM_SIZE:
+            self.stats.count['out_of_range'] += 1
+        return bytes(self.ram.mem[addr:addr + words * 2]).ljust(words * 2, b'\x00')
+
+    def write_vp(self, addr, data):
+        end = addr + len(data)
+        if len(data) % 2 or end > RAM_SIZE:
+            self.stats.count['out_of_range'] += 1
+            return
+        self.ram.mem[addr:end] = data
+        self.stats.count['vp_writes'] += 1
+        if self.record:
+            print(json.dumps({'t': round(self.rx_busy, 6), 'addr': addr, 'data': data.hex()}), file=self.record)
+        if self.ack:
+            self.send(bytes([CMD_WRITE_VP, 0x4f, 0x4b]))
+
+        controls = self.project.vp_range(addr, end)
+        if not controls:
+            self.stats.count['unmapped_writes'] += 1
+        # an update overwritten before the panel redrew it was never seen
+        for vp_addr in {c.vp.addr for c in controls}:
+            last = self.last_write.get(vp_addr)
+            if last is not None and self.rx_busy - last < self.refresh:
+                self.stats.count['superseded'] += 1
+            self.last_write[vp_addr] = self.rx_busy
+
+        if addr <= VP_PIC_SET < end and self.ram.mem[VP_PIC_SET:VP_PIC_SET + 2] == b'\x5a\x01':
+            self.set_page(int.from_bytes(self.ram.mem[VP_PIC_SET + 2:VP_PIC_SET + 4], 'big'))
+            self.ram.mem[VP_PIC_SET:VP_PIC_SET + 2] = b'\x00\x00'
+
+    def write_reg(self, addr, data):
+        self.regs[addr:addr + len(data)] = data
+        if addr <= REG_PIC_ID + 1 and addr + len(data) > REG_PIC_ID:
+            self.set_page(int.from_bytes(self.regs[REG_PIC_ID:REG_PIC_ID + 2], 'big'))
+
+    def set_page(self, page):
+        if page not in self.project.pages:
+            self.stats.count['bad_pages'] += 1
+        self.page = page
+        self.regs[REG_PIC_ID:REG_PIC_ID + 2] = page.to_bytes(2, 'big')
+        self.stats.count['page_switches'] += 1
+
+    ### display -> host ###
+
+    def send(self, payload):
+        frame = self.timing.frame(payload)
+        # replies go out after the request finished arriving and the line is free
+        self.tx_busy = max(self.tx_busy, self.rx_busy) + len(frame) * self.byte_time
+        self.txq.append((self.tx_busy, frame))
+        self.stats.count['frames_tx'] += 1
+
+    def upload(self, vp):
+        addr, words = self.ram.word_span(vp)
+        self.send(bytes([CMD_READ_VP]) + addr.to_bytes(2, 'big') + bytes([words]) +
+                  self.read_words(addr * 2, words))
+
+    def due(self, now) -> bytes:
+        out = b''.join(f for t, f in self.txq if t <= now)
+        self.txq = [(t, f) for t, f in self.txq if t > now]
+        return out
+
+    def next_due(self):
+        return min((t for t, f in self.txq), default=None)
+
+    ### touch synthesis ###
+
+    def touchable(self) -> list:
+        return [c for c in self.project.by_pic.get(self.page, [])
+                if isinstance(c, touch.TouchControl) and c.vp.size]
+
+    def press(self, c, rng: random.Random):
+        vp = c.vp
+        if isinstance(c, touch.Button):
+            value = self.ram.read(vp) ^ 1 if vp.type == VP_Type.BIT else c.keycode
+        elif isinstance(c, touch.Increment):
+            if vp.type == VP_Type.BIT:
+                value = self.ram.read(vp) ^ 1
+            else:
+                value = self.ram.read(vp) + (c.step if c.add else -c.step)
+                if c.min <= value <= c.max:
+                    pass
+                elif c.loop_range:
+                    value = c.min if c.add else c.max
+                else:
+                    value = max(c.min, min(value, c.max))
+        elif isinstance(c, touch.Slider):
+            value = rng.randint(min(c.min, c.max), max(c.min, c.max))
+        elif isinstance(c, touch.Numpad):
+            lo, hi = (c.limit_min, c.limit_max) if c.limits_en else (0, 10 ** c.int_digits - 1)
+            value = rng.randint(lo, hi)
+        elif isinstance(c, touch.Keyboard):
+            value = bytes(rng.choice(b'abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(rng.randint(1, vp.size)))
+        else:
+            return
+        self.ram.write(vp, value)
+        self.upload(vp)
+        self.stats.count['touches'] += 1
+        # 0xffxx: stay on the current page
+        if int(c.pic_next) < 0xff00 and int(c.pic_next) != self.page:
+            self.set_page(int(c.pic_next))
+
+    def touch_random(self, rng: random.Random):
+        controls = self.touchable()
+        if controls:
+            self.press(rng.choice(controls), rng)
+
+def run(sim: Simulator, fd, touch_rate, stats_interval, seed=None):
+    rng = random.Random(seed)
+    now = time.monotonic()
+    next_touch = now + 1 / touch_rate if touch_rate else None
+    next_stats = now + stats_interval
+    while True:
+        deadlines = [t for t in (sim.next_due(), next_touch, next_stats) if t is not None]
+        timeout = max(0.0, min(deadlines) - time.monotonic())
+        r, _, _ = select.select([fd], [], [], timeout)
+        now = time.monotonic()
+        if r:
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                # EIO until a host opens the pty
+                time.sleep(0.05)
+                data = b''
+            if data:
+                sim.feed(data, now)
+        if next_touch is not None and now >= next_touch:
+            sim.touch_random(rng)
+            next_touch += 1 / touch_rate
+        out = sim.due(now)
+        if out:
+            os.write(fd, out)
+            sim.stats.count['bytes_tx'] += len(out)
+        if now >= next_stats:
+            print(f'page {sim.page}: {sim.stats}', flush=True)
+            next_stats += stats_interval
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('--baud', type=int, help='line speed (default: from CONFIG.txt)')
+    parser.add_argument('--ack', action='store_true', help='acknowledge VP writes like a T5UID1')
+    parser.add_argument('--touch-rate', type=float, default=0.0, help='synthesized touches per second')
+    parser.add_argument('--refresh-ms', type=float, default=40.0,
+                        help='writes to a VP closer together than this count as superseded')
+    parser.add_argument('--stats', type=float, default=5.0, help='seconds between stats lines')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--link', type=Path, help='symlink to create for the pty')
+    parser.add_argument('--record', type=argparse.FileType('w'), help='write a VP write trace to this file')
+    args = parser.parse_args()
+
+    timing = config.timing(args.basedir)
+    if args.baud:
+        timing.baud = args.baud
+    sim = Simulator(Project(args.basedir), timing, ack=args.ack, refresh=args.refresh_ms / 1000)
+    sim.record = args.record
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    name = os.ttyname(slave)
+    if args.link:
+        if args.link.is_symlink():
+            args.link.unlink()
+        args.link.symlink_to(name)
+    print(f'simulating {sim.project} on {args.link or name} at {timing.baud} baud', flush=True)
+    try:
+        run(sim, master, args.touch_rate, args.stats, args.seed)
+    except KeyboardInterrupt:
+        print(f'page {sim.page}: {sim.stats}')
+    finally:
+        if args.link and args.link.is_symlink():
+            args.link.unlink()
@@ -0,0 +1,217 @@
+import argparse
+import configparser
+import hashlib
+import json
+from mmap import mmap, ACCESS_READ
+import os
+from pathlib import Path
+import re
+import struct
+
+# .tft files are .NET BinaryFormatter (MS-NRBF) streams of the DGUS
+# editor's documents: one per page, holding the controls drawn on that
+# page's background, plus DWprj.tft for the project itself.
+RECORD_HEADER = 0x00
+RECORD_LIBRARY = 0x0c
+RECORD_CLASS = 0x05
+# shows up as 'CDwinTerminal' in a hex dump, 'C' is the string's length
+TERMINAL_LIBRARY = 'DwinTerminal'
+TERMINAL_VERSION = '6.0'
+
+class Reader:
+    def __init__(self, buf) -> None:
+        self.buf = buf
+        self.off = 0
+
+    def byte(self) -> int:
+        self.off += 1
+        return self.buf[self.off - 1]
+
+    def int32(self) -> int:
+        v, = struct.unpack_from('<i', self.buf, self.off)
+        self.off += 4
+        return v
+
+    def string(self) -> str:
+        # length is a 7-bit varint
+        n = shift = 0
+        while True:
+            b = self.byte()
+            n |= (b & 0x7f) << shift
+            shift += 7
+            if not b & 0x80:
+                break
+        s = self.buf[self.off:self.off + n].decode('utf-8')
+        self.off += n
+        return s
+
+class TftHeader:
+    __slots__ = ('library', 'version', 'cls', 'members')
+
+    def __init__(self, buf) -> None:
+        r = Reader(buf)
+        assert r.byte() == RECORD_HEADER, 'not a BinaryFormatter stream'
+        r.int32(), r.int32()
+        assert (r.int32(), r.int32()) == (1, 0), 'unknown stream version'
+        assert r.byte() == RECORD_LIBRARY, 'missing library record'
+        r.int32()
+        # 'DwinTerminal, Version=6.0.0.1, Culture=neutral, PublicKeyToken=null'
+        name, *attrs = [s.strip() for s in r.string().split(',')]
+        attrs = dict(a.split('=', 1) for a in attrs)
+        self.library = name
+        self.version = attrs.get('Version', '')
+        assert self.library == TERMINAL_LIBRARY, f'not a DGUS document: {self.library}'
+        assert self.version.startswith(TERMINAL_VERSION), f'unsupported version {self.version}'
+        assert r.byte() == RECORD_CLASS, 'missing class record'
+        r.int32()
+        self.cls = r.string()
+        self.members = [r.string() for _ in range(r.int32())]
+
+    def __str__(self) -> str:
+        return '{} {} {} ({} members)'.format(self.library, self.version, self.cls, len(self.members))
+
+def header_error(path: Path):
+    # why a .tft can't be a DGUS document, None if its header reads fine.
+    # Mapped, so only the header's pages are read.
+    try:
+        with path.open('rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+            TftHeader(mm)
+    except (IndexError, struct.error):
+        return 'truncated header'
+    except (AssertionError, ValueError) as e:
+        return str(e) or 'bad header'
+    return None
+
+class HashCache:
+    # content hashes keyed by path, reused while size and mtime match.
+    # Without a filename it only lives as long as the process.
+    def __init__(self, filename: Path = None) -> None:
+        self.filename = filename
+        try:
+            self.entries = json.loads(filename.read_text()) if filename else {}
+        except (OSError, ValueError):
+            self.entries = {}
+        self.dirty = False
+
+    def hash(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path.resolve())
+        e = self.entries.get(key)
+        if e and e['size'] == st.st_size and e['mtime'] == st.st_mtime_ns:
+            return e['sha1']
+        digest = hashlib.sha1(path.read_bytes()).hexdigest()
+        self.entries[key] = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'sha1': digest}
+        self.dirty = True
+        return digest
+
+    def save(self):
+        if self.dirty and self.filename:
+            # only a cache: not being able to keep it costs time, nothing else
+            try:
+                self.filename.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.filename.with_suffix('.tmp')
+                tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True))
+                tmp.replace(self.filename)
+            except OSError:
+                pass
+            self.dirty = False
+
+def default_cache(basedir: Path) -> HashCache:
+    # kept outside the project, one file per basedir so parallel validator
+    # workers don't overwrite each other's entries
+    root = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'dgusm'
+    key = hashlib.sha1(str(Path(basedir).resolve()).encode()).hexdigest()[:16]
+    return HashCache(root / f'hashes-{key}.json')
+
+def hmi_pages(basedir: Path) -> dict:
+    # page id -> bmp name from the project's [IMG] section
+    hmi = next(basedir.glob('*.hmi'), None)
+    if hmi is None:
+        return {}
+    cp = configparser.ConfigParser()
+    cp.read_string(hmi.read_text(errors='replace'))
+    return {int(k): v for k, v in cp['IMG'].items()} if cp.has_section('IMG') else {}
+
+class Manifest:
+    # hashes of every page bmp and its .tft, recorded after an export
+    def __init__(self, basedir, cache=None) -> None:
+        self.basedir = Path(basedir)
+        self.filename = self.basedir / 'TFT' / 'manifest.json'
+        # nothing is written into the project, repeat checks only stat the
+        # files
+        self.cache = cache or default_cache(self.basedir)
+        try:
+            self.recorded = json.loads(self.filename.read_text())
+        except (OSError, ValueError):
+            self.recorded = None
+
+    def bmps(self) -> dict:
+        return {f.name: f for f in (self.basedir / 'DWIN_SET').glob('*.bmp') if re.match(r'\d{3}_', f.name)}
+
+    def documents(self) -> list:
+        # every page document and the project's own
+        return sorted((self.basedir / 'TFT').glob('*.tft')) + sorted(self.basedir.glob('*.tft'))
+
+    def tfts(self) -> dict:
+        # 001_home.bmp.tft pairs with 001_home.bmp
+        return {f.name[:-len('.tft')]: f for f in (self.basedir / 'TFT').glob('*.bmp.tft')}
+
+    def current(self) -> dict:
+        pairs = {}
+        bmps, tfts = self.bmps(), self.tfts()
+        for name in sorted(bmps.keys() & tfts.keys()):
+            pairs[name] = {'bmp': self.cache.hash(bmps[name]), 'tft': self.cache.hash(tfts[name])}
+        return pairs
+
+    def check(self) -> dict:
+        bmps, tfts = self.bmps(), self.tfts()
+        listed = set(hmi_pages(self.basedir).values())
+        result = {
+            'missing': sorted(bmps.keys() - tfts.keys()),
+            'orphaned': sorted(tfts.keys() - bmps.keys()),
+            'unlisted': sorted(bmps.keys() - listed) if listed else [],
+            'stale': [],
+            # truncated or not written by the DGUS editor
+            'invalid': [],
+        }
+        for f in self.documents():
+            error = header_error(f)
+            if error:
+                result['invalid'].append(f'{f.name}: {error}')
+        if self.recorded is not None:
+            for name, now in self.current().items():
+                then = self.recorded.get(name)
+                # the background changed but the page was never re-exported
+                if then and now['bmp'] != then['bmp'] and now['tft'] == then['tft']:
+                    result['stale'].append(name)
+        self.cache.save()
+        return result
+
+    def update(self):
+        self.recorded = self.current()
+        self.filename.write_text(json.dumps(self.recorded, indent=1, sort_keys=True))
+        self.cache.save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('--update', action='store_true', help='record the current bmp/tft pairs as exported')
+    parser.add_argument('--headers', action='store_true', help='print each .tft header')
+    parser.add_argument('--cache', type=Path, help='keep file hashes here between runs '
+                        '(default: under $XDG_CACHE_HOME/dgusm)')
+    args = parser.parse_args()
+    m = Manifest(args.basedir, HashCache(args.cache) if args.cache else None)
+    if args.headers:
+        for f in m.documents():
+            error = header_error(f)
+            print(f'{f.name}: {error or TftHeader(f.read_bytes())}')
+    if args.update:
+        m.update()
+        print(f'recorded {len(m.recorded)} pages in {m.filename}')
+    else:
+        if m.recorded is None:
+            print(f'no {m.filename}, run with --update after exporting')
+        for kind, names in m.check().items():
+            for name in names:
+                print(f'{kind}: {name}')
@@ -5,6 +5,8 @@ from ctypes import *
 from .common import *
 
 class TouchArea(BigEndianStructure):
+    # derived attributes live in slots so records don't each carry a __dict__
+    __slots__ = ()
     _pack_ = 1
     _fields_ = [("pic", Pic),
                 ("area", Area),
@@ -19,10 +21,13 @@ class TouchArea(BigEndianStructure):
         cls.type_map.update(dict.fromkeys(cls.type_codes, cls))
 
     def get_subclass(self) -> object:
-        return self.type_map[self.type]
+        try:
+            return self.type_map[self.type]
+        except KeyError:
+            raise ValueError(f'unknown touch record type 0x{self.type:02x}') from None
 
     def __new__(cls, buf, off):
-        return cls.from_buffer(buf, off)
+        return cls.from_buffer_copy(buf, off)
 
     def __init__(self, buf, off) -> None:
         assert sizeof(TouchArea) == 0x10
@@ -31,6 +36,8 @@ class TouchArea(BigEndianStructure):
         return '{} {}'.format(self.pic, self.area)
 
 class Key:
+    __slots__ = ('code',)
+
     special_keycodes = {
         0xf0: 'cancel',
         0xf1: 'return',
@@ -54,6 +61,7 @@ class Key:
 
 class NumpadKey(TouchArea):
     type_codes = (0x00,)
+    __slots__ = ('key',)
 
     def __init__(self, buf, off) -> None:
         super().__init__(buf, off)
@@ -64,6 +72,7 @@ class NumpadKey(TouchArea):
 
 class KeyboardKey(TouchArea):
     type_codes = range(1, 0x80)
+    __slots__ = ('upper', 'lower')
 
     def __init__(self, buf, off) -> None:
         super().__init__(buf, off)
@@ -74,6 +83,7 @@ class KeyboardKey(TouchArea):
         return '{} keyboard:⇩{}⇧{}'.format(super().__str__(), self.lower, self.upper)
 
 class TouchControl(TouchArea):
+    __slots__ = ('vp',)
     _pack_ = 1
     _fields_ = [("_continue0", c_uint8),
                 ("vp_word", c_uint16)]
@@ -91,13 +101,17 @@ class TouchControl(TouchArea):
         cls.subtypes[cls.subtype_code] = cls
 
     def get_subclass(self) -> object:
-        return self.subtypes[self.subtype]
+        try:
+            return self.subtypes[self.subtype]
+        except KeyError:
+            raise ValueError(f'unknown touch control subtype 0x{self.subtype:02x}') from None
 
     def __str__(self) -> str:
         return '{} ctl:{:<9} {}'.format(super().__str__(), self.__class__.__name__, self.vp)
 
 class Numpad(TouchControl):
     subtype_code = 0x00
+    __slots__ = ()
     _pack_ = 1
     _fields_ = [("vp_format", c_uint8),
                 ("int_digits", c_uint8),
@@ -125,6 +139,7 @@ class Numpad(TouchControl):
 
 class Increment(TouchControl):
     subtype_code = 0x02
+    __slots__ = ()
     _pack_ = 1
     _fields_ = [("bit_mode", Bool, 4),
                 ("vp_format", c_uint8, 4),
@@ -145,6 +160,7 @@ class Increment(TouchControl):
 
 class Slider(TouchControl):
     subtype_code = 0x03
+    __slots__ = ()
     _pack_ = 1
     _fields_ = [("vp_format", c_uint8, 4),
                 ("vertical", Bool, 4),
@@ -158,6 +174,7 @@ class Slider(TouchControl):
 
 class Button(TouchControl):
     subtype_code = 0x05
+    __slots__ = ()
     _pack_ = 1
     _fields_ = [("bit_mode", Bool, 4),
                 ("vp_format", c_uint8, 4),
@@ -176,6 +193,7 @@ class Button(TouchControl):
 
 class Keyboard(TouchControl):
     subtype_code = 0x06
+    __slots__ = ()
     _pack_ = 1
     _fields_ = [("vp_len_words", c_uint8),
                 ("modify", Bool),
@@ -214,23 +232,73 @@ class Parser:
                 return touch
             touch = t(mm, off)
 
-    def __init__(self, dirname):
+    @staticmethod
+    def record_size(mm, off) -> int:
+        # how far to skip over a record that failed to parse
+        try:
+            area = TouchArea(mm, off)
+        except PARSE_ERRORS:
+            return sizeof(TouchArea)
+        try:
+            t = area.get_subclass()
+            if t is TouchControl:
+                t = TouchControl(mm, off).get_subclass()
+            return sizeof(t)
+        except PARSE_ERRORS:
+            pass
+        # a control of unknown subtype has at least one more row, and any
+        # record may go on in rows that start with the 0xfe continuation byte
+        size = sizeof(TouchArea) * (2 if area.type in TouchControl.type_codes else 1)
+        while off + size < len(mm) and mm[off + size] == 0xfe:
+            size += sizeof(TouchArea)
+        return size
+
+    def __init__(self, dirname, strict=True):
         d = Path(dirname) / 'DWIN_SET'
-        filename = next(d.glob('13*.bin'))
-
-        with open(filename, 'r+b') as f:
-            # cannot be read-only if we want to use the buffer directly
-            #mm = mmap(f.fileno(), 0, access=ACCESS_READ)
-            self.mm = mmap(f.fileno(), 0)
+        self.filename = next(d.glob('13*.bin'), None)
+        if self.filename is None:
+            raise FileNotFoundError(f'no 13*.bin in {d}')
+        # not strict: bad records become diagnostics and parsing goes on
+        self.strict = strict
+        self.diagnostics = []
+
+        with open(self.filename, 'rb') as f:
+            # records are copied out, so they don't pin the mapping
+            self.mm = map_file(f, self.strict, self.diagnostics, self.filename)
             # print(filename, 'len', len(mm))
-
+            if self.mm:
+                self.check_end()
+
+    @classmethod
+    def from_buffer(cls, buf, strict=True, filename='<buffer>'):
+        self = cls.__new__(cls)
+        self.filename = filename
+        self.strict = strict
+        self.diagnostics = []
+        self.mm = buf
+        self.check_end()
+        return self
+
+    def check_end(self):
+        try:
             assert self.mm[-2:] == b'\xff\xff', "file should end in 0xffff"
+        except AssertionError as e:
+            if self.strict:
+                raise
+            self.diagnostics.append(Diagnostic(self.filename, max(len(self.mm) - 2, 0), e))
 
     def __iter__(self):
         off = 0
         while off + 2 < len(self.mm):
             # print('off: {:04x}'.format(off))
-            t = self.make_class(self.mm, off)
+            try:
+                t = self.make_class(self.mm, off)
+            except PARSE_ERRORS as e:
+                if self.strict:
+                    raise
+                self.diagnostics.append(Diagnostic(self.filename, off, e))
+                off += self.record_size(self.mm, off)
+                continue
             off += sizeof(t)
             yield t
 
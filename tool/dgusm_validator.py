@@ -2,74 +2,24 @@
 
 import argparse
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import sys
-import bisect
 
-from numpy import isin
-from dgus import touch, display, iconlib, pages as dpages
-from dgus.common import VP, VP_Type
+from dgus import touch, display, rules, pages as dpages, iconlib
+from dgus.animation import over_budget, FILL_BUDGET
+from dgus.contrast import Checker as ContrastChecker, min_contrast
+from dgus import config
+from dgus.flash import FlashMap
+from dgus import hostvp
+from dgus.tft import Manifest
+from dgus.common import VP_Type
+from dgus.project import Project, FakeApControl
 
 TOTAL_RAM = 4096
 MAX_PAGE = 374 - 1
 RESOLUTION = (480, 272)
-MAX_ICON_DIMS = (255, 255)
-
-dcontrols = []
-tcontrols = []
-pages = {}
-iconlibs = {}
-ramlist = []
-
-def info(*str):
-    print('INFO:', *str)
-
-def warn(*str):
-    print('WARNING:', *str, file=sys.stderr)
-
-def err(*str):
-    print('ERROR:', *str, file=sys.stderr)
-
-def check(cond, *str) -> bool:
-    if cond:
-        return True
-    err(*str)
-    return False
-
-def check_eq(a, b, *str) -> bool:
-    return check(a == b, *str, f'DURING ASSERT({a} == {b})')
-
-def check_neq(a, b, *str) -> bool:
-    return check(a != b, *str, f'DURING ASSERT({a} != {b})')
-
-def check_leq(a, b, *str) -> bool:
-    return check(a <= b, *str, f'DURING ASSERT({a} <= {b})')
-
-class FakeApControl:
-    def __init__(self, control) -> None:
-        self.control = control
-        self.vp = control.ap
-
-    def __str__(self) -> str:
-        return f'AUX_PTR of [{self.control}]'
-
-def populate_ram():
-    aux_ptrs = []
-    for c in dcontrols:
-        if not hasattr(c, 'ap'):
-            continue
-        aux_ptrs.append(FakeApControl(c))
-
-    for c in [*dcontrols, *tcontrols, *aux_ptrs]:
-        if not hasattr(c, 'vp') or c.vp.size == 0:
-            continue
-        ramlist.append(c)
-
-    ramlist.sort(key=lambda c: c.vp.addr)
-
-def check_vp_ram_size():
-    last = ramlist[-1]
-    check_leq(last.vp.end, TOTAL_RAM, f'last VP past end of RAM: {last}')
+MAX_ICON_DIMS = iconlib.MAX_ICON_DIMS
 
 def one_isinstance(cls, *x) -> bool:
     for c in x:
@@ -81,156 +31,287 @@ def allow_paired_controls(a, b, cls1, cls2) -> bool:
     return (isinstance(a, cls1) and isinstance(b, cls2)) or \
         (isinstance(a, cls2) and isinstance(b, cls1))
 
-def check_vp_overlap():
-    last = ramlist[0]
-    for c in ramlist[1:]:
-        if c.vp.addr < last.vp.end:
-            if check_eq(c.vp.type, last.vp.type, f'VP usage mismatch [{c}] <=> [{last}]'):
-                # address overlap of same types
-                check_eq(c.vp.addr, last.vp.addr, f'VP addr mismatch [{c}] <=> [{last}]')
-                check_eq(c.vp.size, last.vp.size, f'VP size mismatch [{c}] <=> [{last}]')
-                if c.__class__ != last.__class__:
-                    # this should be allowed for some items (control vs display for example)
-                    if allow_paired_controls(c, last, touch.Increment, display.Numeric):
-                        pass
-                    elif allow_paired_controls(c, last, touch.Slider, touch.Button): # min/max buttons
-                        pass
-                    elif allow_paired_controls(c, last, display.Slider, display.Icon): # 'track' slider
-                        pass
-                    else:
-                        err(f'VP control type mismatch [{c}] <=> [{last}]')
-                elif isinstance(c, FakeApControl):
-                    err(f'AUX_PTRs cannot overlap: [{c}] <=> [{last}]')
-
-                #info(f'VP overlap "{last}" <=> "{c}"')
-        last = c
-
-def check_unique_keycodes():
-    keycodes = defaultdict(dict)
-    for c in tcontrols:
-        if not hasattr(c, 'keycode'):
-            continue
-        addrdict = keycodes[c.vp.addr]
-        if c.keycode in addrdict:
-            # allow if on different pages
-            other = addrdict[c.keycode]
-            if c.pic == other.pic:
-                err(f'duplicate keycode {c.keycode:04x} at addr {c.vp.addr:04x} [{c}] <=> [{addrdict[c.keycode]}]')
-        else:
-            addrdict[c.keycode] = c
-
-def check_textbox_sizes():
-    for c in dcontrols:
-        if not isinstance(c, display.Text):
-            continue
-        check_eq(c.x_px * 2, c.y_px, f'TextBox char x/y sizes wrong [{c}]')
-        line_height = c.y_px + c.y_tracking_px
-        if int(c.area.size().y) < c.y_px:
-            lines = 0
+def assert_msg(a, op, b, *str) -> str:
+    return ' '.join([*str, f'DURING ASSERT({a} {op} {b})'])
+
+RULES = rules.RuleSet()
+CONTROLS = (display.DisplayVariable, touch.TouchArea)
+
+@RULES.rule('page-id', types=dpages.Page)
+def rule_page_id(project, p, field, value):
+    if int(p.pic) > MAX_PAGE:
+        yield assert_msg(int(p.pic), '<=', MAX_PAGE, f'page id {int(p.pic)} too large')
+
+@RULES.rule('page-resolution', types=dpages.Page)
+def rule_page_resolution(project, p, field, value):
+    if p.size != RESOLUTION:
+        yield assert_msg(p.size, '==', RESOLUTION, f'resolution mismatch {p}')
+
+@RULES.rule('icon-size', types=iconlib.IconLib)
+def rule_icon_size(project, lib, field, value):
+    for i in lib.icons:
+        if not i.size <= MAX_ICON_DIMS:
+            yield assert_msg(i.size, '<=', MAX_ICON_DIMS, f'icon {i} in {lib} too large')
+
+@RULES.rule('control-page', types=CONTROLS)
+def rule_control_page(project, c, field, value):
+    if int(c.pic) not in project.pages:
+        yield f'bad pic for [{c}]'
+
+@RULES.rule('qword', types=CONTROLS, fields=('vp',))
+def rule_qword(project, c, field, vp):
+    if vp.type == VP_Type.QWORD:
+        yield assert_msg(vp.type, '!=', VP_Type.QWORD, f'QWORDs are not supported: [{c}]')
+
+@RULES.rule('iconlib', types=CONTROLS, fields=('icon_lib',))
+def rule_iconlib(project, c, field, lib_id):
+    if lib_id not in project.iconlibs:
+        yield f'bad iconlib for [{c}]'
+
+# unused icons should be set to 0 which should always exist in lib
+@RULES.rule('icon-index', types=CONTROLS,
+            fields=('icon', 'icon_min', 'icon_max', 'icon0s', 'icon0e', 'icon1s', 'icon1e'))
+def rule_icon_index(project, c, field, index):
+    lib = project.iconlibs.get(c.icon_lib)
+    if lib is not None and index > len(lib.icons) - 1:
+        yield assert_msg(index, '<=', len(lib.icons) - 1, f'bad icon index in [{c}]')
+
+@RULES.rule('font-encoding', types=CONTROLS, fields=('encoding',), level=rules.WARNING)
+def rule_font_encoding(project, c, field, encoding):
+    if encoding != 0:
+        yield f'font encoding {encoding} should probably be 0 (8-bit): [{c}]'
+
+# unused fonts should be set to 0 which should always exist
+@RULES.rule('fontlib', types=CONTROLS, fields=('font', 'font_ascii', 'font_nonascii'))
+def rule_fontlib(project, c, field, font):
+    if font != 0:
+        yield assert_msg(font, '==', 0, f'bad fontlib in [{c}]')
+
+def textbox_lines(c) -> int:
+    if int(c.area.size().y) < c.y_px:
+        return 0
+    return 1 + (c.area.size().y - c.y_px) // (c.y_px + c.y_tracking_px)
+
+@RULES.rule('textbox-char-size', types=display.Text)
+def rule_textbox_char_size(project, c, field, value):
+    if c.x_px * 2 != c.y_px:
+        yield assert_msg(c.x_px * 2, '==', c.y_px, f'TextBox char x/y sizes wrong [{c}]')
+
+@RULES.rule('textbox-height', types=display.Text)
+def rule_textbox_height(project, c, field, value):
+    extra = (c.area.size().y - c.y_px) % (c.y_px + c.y_tracking_px)
+    if extra != 0:
+        yield assert_msg(extra, '==', 0, f'box is wrong height {c}')
+
+@RULES.rule('textbox-width', types=display.Text)
+def rule_textbox_width(project, c, field, value):
+    needed_width = c.length * (c.x_px + c.x_kerning_px)
+    width = int(c.area.size().x) * textbox_lines(c)
+    if c.monospace and width != needed_width:
+        yield assert_msg(width, '==', needed_width, f'monospaced textbox incorrect size ({width}px != {needed_width}px) [{c}]')
+
+@RULES.rule('textbox-width-variable', types=display.Text, level=rules.WARNING)
+def rule_textbox_width_variable(project, c, field, value):
+    needed_width = c.length * (c.x_px + c.x_kerning_px)
+    width = int(c.area.size().x) * textbox_lines(c)
+    if not c.monospace and width < needed_width:
+        yield f'non-monospaced textbox possibly too small ({width}px < {needed_width}px): [{c}]'
+
+class Validator:
+    def __init__(self, project: Project) -> None:
+        self.project = project
+        # (is_stderr, line) in emission order, so batch runs can replay them
+        self.messages = []
+        self.errors = 0
+
+    def info(self, *str):
+        self.messages.append((False, ' '.join(['INFO:', *str])))
+
+    def warn(self, *str):
+        self.messages.append((True, ' '.join(['WARNING:', *str])))
+
+    def err(self, *str):
+        self.errors += 1
+        self.messages.append((True, ' '.join(['ERROR:', *str])))
+
+    def check(self, cond, *str) -> bool:
+        if cond:
+            return True
+        self.err(*str)
+        return False
+
+    def check_eq(self, a, b, *str) -> bool:
+        return self.check(a == b, *str, f'DURING ASSERT({a} == {b})')
+
+    def check_neq(self, a, b, *str) -> bool:
+        return self.check(a != b, *str, f'DURING ASSERT({a} != {b})')
+
+    def check_leq(self, a, b, *str) -> bool:
+        return self.check(a <= b, *str, f'DURING ASSERT({a} <= {b})')
+
+    def check_vp_ram_size(self):
+        if not self.project.ramlist:
+            return
+        last = self.project.ramlist[-1]
+        self.check_leq(last.vp.end, TOTAL_RAM, f'last VP past end of RAM: {last}')
+
+    def check_vp_overlap(self):
+        ramlist = self.project.ramlist
+        if not ramlist:
+            return
+        last = ramlist[0]
+        for c in ramlist[1:]:
+            if c.vp.addr < last.vp.end:
+                if self.check_eq(c.vp.type, last.vp.type, f'VP usage mismatch [{c}] <=> [{last}]'):
+                    # address overlap of same types
+                    self.check_eq(c.vp.addr, last.vp.addr, f'VP addr mismatch [{c}] <=> [{last}]')
+                    self.check_eq(c.vp.size, last.vp.size, f'VP size mismatch [{c}] <=> [{last}]')
+                    if c.__class__ != last.__class__:
+                        # this should be allowed for some items (control vs display for example)
+                        if allow_paired_controls(c, last, touch.Increment, display.Numeric):
+                            pass
+                        elif allow_paired_controls(c, last, touch.Slider, touch.Button): # min/max buttons
+                            pass
+                        elif allow_paired_controls(c, last, display.Slider, display.Icon): # 'track' slider
+                            pass
+                        else:
+                            self.err(f'VP control type mismatch [{c}] <=> [{last}]')
+                    elif isinstance(c, FakeApControl):
+                        self.err(f'AUX_PTRs cannot overlap: [{c}] <=> [{last}]')
+
+                    #self.info(f'VP overlap "{last}" <=> "{c}"')
+            last = c
+
+    def check_unique_keycodes(self):
+        keycodes = defaultdict(dict)
+        for c in self.project.with_attr('keycode'):
+            addrdict = keycodes[c.vp.addr]
+            if c.keycode in addrdict:
+                # allow if on different pages
+                other = addrdict[c.keycode]
+                if c.pic == other.pic:
+                    self.err(f'duplicate keycode {c.keycode:04x} at addr {c.vp.addr:04x} [{c}] <=> [{addrdict[c.keycode]}]')
+            else:
+                addrdict[c.keycode] = c
+
+    def check_flash(self):
+        fm = FlashMap(self.project.basedir)
+        for a, b in fm.asset_collisions():
+            self.err(f'flash slots overlap: [{a}] <=> [{b}]')
+        for a, b in fm.picture_collisions():
+            self.err(f'duplicate picture id: [{a}] <=> [{b}]')
+        for a in fm.overflows():
+            self.err(f'does not fit in flash: [{a}]')
+
+    def check_config(self):
+        basedir = self.project.basedir
+        for is_error, msg in config.check(config.Config.load(basedir), config.VarInit.load(basedir)):
+            (self.err if is_error else self.warn)(f'CONFIG: {msg}')
+
+    def check_tft(self):
+        if not (self.project.basedir / 'TFT').is_dir():
+            return
+        result = Manifest(self.project.basedir).check()
+        for name in result['missing']:
+            self.warn(f'no TFT page document for {name}')
+        for name in result['orphaned']:
+            self.warn(f'TFT page document without a bmp: {name}.tft')
+        for name in result['unlisted']:
+            self.warn(f'{name} is not listed in the .hmi project')
+        for name in result['stale']:
+            self.err(f'{name} changed since the project was last exported')
+        for msg in result['invalid']:
+            self.err(f'unreadable TFT document {msg}')
+
+    def check_contrast(self):
+        for f in ContrastChecker(self.project).low_contrast():
+            self.warn(f'low text contrast (< {min_contrast(f.control)}:1): {f}')
+
+    def check_animation_load(self):
+        for pic, total, anims in over_budget(self.project):
+            self.warn(f'P{pic:<3} animations redraw {total:.0f} px/s > {FILL_BUDGET} px/s budget, '
+                      f'touch may lag: {len(anims)} animated controls')
+
+    def check_host_vps(self, hostvps):
+        mismatches, unused, missing = hostvp.Crosscheck(self.project, hostvps).run()
+        for h, c in mismatches:
+            self.err(f'host VP mismatch [{h}] <=> [{c}]')
+        for h in unused:
+            self.warn(f'no control uses [{h}]')
+        for c in missing:
+            side = 'reads' if isinstance(c, touch.TouchControl) else 'writes'
+            self.warn(f'host never {side} [{c}]')
+
+    def report(self, level, msg):
+        if level == rules.WARNING:
+            self.warn(msg)
         else:
-            lines = 1 + (c.area.size().y - c.y_px) // line_height
-        check_eq((c.area.size().y - c.y_px) % line_height, 0, f'box is wrong height {c}')
-        needed_width = c.length * (c.x_px + c.x_kerning_px)
-        width = int(c.area.size().x) * lines
-        if c.monospace:
-            check_eq(width, needed_width, f'monospaced textbox incorrect size ({width}px != {needed_width}px) [{c}]')
-        elif width < needed_width:
-            warn(f'non-monospaced textbox possibly too small ({width}px < {needed_width}px): [{c}]')
-
-def check_unsupported_numerics():
-    for c in ramlist:
-        check_neq(c.vp.type, VP_Type.QWORD, f'QWORDs are not supported: [{c}]')
-
-
-def populate_pages(dir):
-    for p in dpages.Parser(dir):
-        pages[int(p.pic)] = p
-
-def populate_icons(dir):
-    for i in iconlib.Parser(dir):
-        iconlibs[i.id] = i
-
-def check_pages():
-    maxpage = max(pages.keys())
-    check_leq(maxpage, MAX_PAGE, f'page id {maxpage} too large')
-    for p in pages.values():
-        check_eq(p.size, RESOLUTION, f'resolution mismatch {p}')
-
-def check_icons():
-    for lib in iconlibs.values():
-        for i in lib.icons:
-            check_leq(i.size, MAX_ICON_DIMS, f'icon {i} in {lib} too large')
-
-def check_control_page_usage():
-    for c in [*dcontrols, *tcontrols]:
-        check(int(c.pic) in pages, f'bad pic for [{c}]')
-
-def check_icon_property(lib, c, prop):
-    # unused icons should be set to 0 which should always exist in lib
-    if hasattr(c, prop):
-        check_leq(getattr(c, prop), len(lib.icons) - 1, f'bad icon index in [{c}]')
-
-def check_control_icon_usage():
-    for c in dcontrols:
-        if not hasattr(c, 'icon_lib'):
-            continue
-
-        if not check(c.icon_lib in iconlibs, f'bad iconlib for [{c}]'):
-            continue
-
-        lib = iconlibs[c.icon_lib]
-
-        check_icon_property(lib, c, 'icon')
-        check_icon_property(lib, c, 'icon_min')
-        check_icon_property(lib, c, 'icon_max')
-        check_icon_property(lib, c, 'icon0s')
-        check_icon_property(lib, c, 'icon0e')
-        check_icon_property(lib, c, 'icon1s')
-        check_icon_property(lib, c, 'icon1e')
-
-def check_font_encoding():
-    for c in dcontrols:
-        if not hasattr(c, 'encoding'):
-            continue
-        if c.encoding == 0:
-            continue
-        warn(f'font encoding {c.encoding} should probably be 0 (8-bit): [{c}]')
-
-def check_fontlib_property(c, prop):
-    # unused icons should be set to 0 which should always exist in lib
-    if hasattr(c, prop):
-        check_eq(getattr(c, prop), 0, f'bad fontlib in [{c}]')
-
-def check_fontlibs():
-    for c in [*dcontrols, *tcontrols]:
-        check_fontlib_property(c, 'font')
-        check_fontlib_property(c, 'font_ascii')
-        check_fontlib_property(c, 'font_nonascii')
+            self.err(msg)
+
+    def run(self):
+        p = self.project
+        for d in p.diagnostics:
+            self.err(f'unparseable record skipped: {d}')
+        self.check_vp_ram_size()
+        self.check_vp_overlap()
+        self.check_unique_keycodes()
+        self.check_flash()
+        self.check_config()
+        self.check_tft()
+        self.check_contrast()
+        self.check_animation_load()
+
+        # everything checkable one record at a time, in a single pass
+        records = [*p.pages.values(), *p.iconlibs.values(), *p.controls()]
+        fired = RULES.run(p, records, self.report)
+        if fired:
+            self.info('rules fired:', ', '.join(f'{name} x{n}' for name, n in fired.items()))
+        return self
+
+def validate(basedir: Path, rule_files=(), host_vps=None, strict=False):
+    # runs in a worker process: only plain data goes back to the parent
+    for f in rule_files:
+        RULES.load(f)
+    v = Validator(Project(basedir, strict)).run()
+    if host_vps is not None:
+        v.check_host_vps(hostvp.load(host_vps))
+    return v.messages, v.errors
+
+def print_messages(messages, prefix=''):
+    for is_stderr, line in messages:
+        print(prefix + line, file=sys.stderr if is_stderr else sys.stdout)
 
 ### main ###
-parser = argparse.ArgumentParser()
-parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
-args = parser.parse_args()
-
-# read everything in
-tcontrols = list(touch.Parser(args.basedir))
-dcontrols = list(display.Parser(args.basedir))
-populate_pages(args.basedir)
-populate_icons(args.basedir)
-populate_ram()
-
-# do actual validation
-check_pages()
-check_icons()
-check_vp_ram_size()
-check_vp_overlap()
-check_unique_keycodes()
-check_textbox_sizes()
-check_unsupported_numerics()
-check_control_page_usage()
-check_control_icon_usage()
-check_font_encoding()
-check_fontlibs()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='*', type=Path, default=[Path('../dgusm')])
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes when validating several basedirs (default: CPU count)')
+    parser.add_argument('-r', '--rules', type=Path, action='append', default=[],
+                        help='python file registering extra checks on `rules`')
+    parser.add_argument('--strict', action='store_true',
+                        help='stop with a traceback at the first record that fails to parse')
+    parser.add_argument('--host-vps', type=Path, help='host VP definitions (.json or .yaml) to check against')
+    args = parser.parse_args()
+
+    errors = 0
+    if len(args.basedir) == 1:
+        messages, errors = validate(args.basedir[0], args.rules, args.host_vps, args.strict)
+        print_messages(messages)
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(validate, basedir, args.rules, args.host_vps, args.strict)
+                       for basedir in args.basedir]
+            for basedir, future in zip(args.basedir, futures):
+                # one broken basedir must not cost the results of the others
+                try:
+                    messages, n = future.result()
+                except Exception as e:
+                    messages, n = [(True, f'ERROR: {e.__class__.__name__}: {e}')], 1
+                print_messages(messages, f'{basedir}: ')
+                errors += n
+
+    sys.exit(1 if errors else 0)
 
 #TODO:
 # add fontlib check?
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import argparse
+from ctypes import sizeof
+from collections import Counter
+from pathlib import Path
+import random
+import re
+import sys
+import time
+import traceback
+
+from dgus import display, iconlib, touch
+
+INTERESTING = (0x00, 0x01, 0x5a, 0x7f, 0x80, 0xfd, 0xfe, 0xff)
+
+# each returns the records and how many bytes it looked at
+
+def parse_touch(buf, diagnostics):
+    p = touch.Parser.from_buffer(buf, strict=False)
+    records = list(p)
+    diagnostics += p.diagnostics
+    return records, len(buf)
+
+def parse_display(buf, diagnostics):
+    p = display.Parser.from_buffer(buf, strict=False)
+    records = list(p)
+    diagnostics += p.diagnostics
+    return records, len(buf)
+
+def parse_iconlib(buf, diagnostics):
+    # only the index is parsed, up to the first unused entry
+    icons = iconlib.Parser.parse_icons(buf, diagnostics)
+    return icons, min(len(buf), (len(icons) + 1) * sizeof(iconlib.Icon))
+
+# file glob, parse function, record alignment
+TARGETS = {
+    'touch': ('13*.bin', parse_touch, 0x10),
+    'display': ('14*.bin', parse_display, 0x20),
+    'iconlib': ('*.ico', parse_iconlib, 0x08),
+}
+
+def hot_offsets(buf, align, limit) -> list:
+    # record starts that aren't empty: mutating zero padding tests nothing
+    return [off for off in range(0, min(len(buf), limit), align) if any(buf[off:off + align])]
+
+def mutate(rng, buf, hot, align) -> bytes:
+    b = bytearray(buf)
+    for _ in range(rng.randint(1, 4)):
+        off = rng.choice(hot) + rng.randrange(align) if hot and rng.random() < 0.9 else rng.randrange(len(b))
+        # an earlier truncation may have cut it off
+        off = min(off, len(b) - 1)
+        kind = rng.randrange(5)
+        if kind == 0:
+            b[off] ^= 1 << rng.randrange(8)
+        elif kind == 1:
+            b[off] = rng.randrange(256)
+        elif kind == 2:
+            b[off] = rng.choice(INTERESTING)
+        elif kind == 3 and hot:
+            # copy one record over another
+            src = rng.choice(hot)
+            dst = rng.choice(hot)
+            b[dst:dst + align] = b[src:src + align]
+        elif kind == 4:
+            del b[rng.randrange(len(b)):]
+        if not b:
+            break
+    return bytes(b)
+
+class Stats:
+    def __init__(self) -> None:
+        self.runs = 0
+        self.records = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.diagnostics = Counter()
+        self.crashes = {}
+
+    def __str__(self) -> str:
+        s = max(self.seconds, 1e-9)
+        return '{:6} runs {:9.0f} records/s {:7.2f} MB/s {:6} diagnostics {:3} crashes'.format(
+            self.runs, self.records / s, self.bytes / s / 1e6, sum(self.diagnostics.values()), len(self.crashes))
+
+def fuzz(name, buf, parse, align, rng, iterations, crash_dir) -> Stats:
+    stats = Stats()
+    hot = hot_offsets(buf, align, 256 * 1024 if name == 'iconlib' else len(buf))
+    for n in range(iterations):
+        data = mutate(rng, buf, hot, align)
+        diagnostics = []
+        start = time.perf_counter()
+        try:
+            records, scanned = parse(data, diagnostics)
+            stats.seconds += time.perf_counter() - start
+            stats.records += len(records)
+            stats.bytes += scanned
+            # the validator prints records, that has to survive too
+            for r in records:
+                str(r)
+        except Exception as e:
+            # anything escaping the tolerant parser is a bug
+            frame = traceback.extract_tb(e.__traceback__)[-1]
+            key = (e.__class__.__name__, frame.filename, frame.lineno)
+            if key not in stats.crashes:
+                stats.crashes[key] = (n, f'{e.__class__.__name__}: {e} at {Path(frame.filename).name}:{frame.lineno}')
+                if crash_dir:
+                    crash_dir.mkdir(parents=True, exist_ok=True)
+                    (crash_dir / f'{name}-{n}.bin').write_bytes(data)
+        stats.runs += 1
+        # grouped by kind, not by the values involved
+        stats.diagnostics.update(re.sub(r'\b(0x[0-9a-f]+|\d+)\b', 'N', f'{d.error}: {d.message}') for d in diagnostics)
+    return stats
+
+### main ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('basedir', nargs='?', type=Path, default='../dgusm')
+    parser.add_argument('-n', '--iterations', type=int, default=100, help='mutated inputs per file')
+    parser.add_argument('--target', choices=TARGETS, action='append', help='only fuzz these parsers')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--crash-dir', type=Path, help='save the first input of every distinct crash here')
+    parser.add_argument('-v', '--verbose', action='store_true', help='list diagnostics by message')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    crashed = False
+    for name, (pattern, parse, align) in TARGETS.items():
+        if args.target and name not in args.target:
+            continue
+        for f in sorted((args.basedir / 'DWIN_SET').glob(pattern)):
+            buf = f.read_bytes()
+            stats = fuzz(name, buf, parse, align, rng, args.iterations, args.crash_dir)
+            print(f'{name:>7} {f.name}: {stats}')
+            for n, msg in stats.crashes.values():
+                crashed = True
+                print(f'  CRASH at iteration {n}: {msg}')
+            if args.verbose:
+                for msg, count in stats.diagnostics.most_common():
+                    print(f'  {count:6} {msg}')
+    if crashed:
+        sys.exit(1)
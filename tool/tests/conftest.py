@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the dgus package sits next to the scripts, not installed
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,83 @@
+import pytest
+
+from dgus import config
+from dgus.config import CMD_WRITE_VP
+from dgus.coalesce import Coalescer
+from dgus.common import VP, VP_Type
+
+def vp(word_addr, type, **kwargs):
+    v = VP(word_addr)
+    v.set_type(type, **kwargs)
+    return v
+
+def frame(addr, data):
+    return config.Timing().frame(bytes([CMD_WRITE_VP]) + addr.to_bytes(2, 'big') + data)
+
+def test_gap_of_unknown_words_is_not_bridged():
+    c = Coalescer()
+    c.write(0, b'\x00\x07')
+    c.write(8, b'\x00\x09')
+    assert c.flush() == [frame(0, b'\x00\x07'), frame(4, b'\x00\x09')]
+
+def test_gap_of_known_words_is_bridged():
+    c = Coalescer()
+    c.observe(0, b'\x00\x00\x00\x01\x00\x20\x00\x03\x00\x04')
+    c.write(0, b'\x00\x07')
+    c.write(8, b'\x00\x09')
+    assert c.flush() == [frame(0, b'\x00\x07\x00\x01\x00\x20\x00\x03\x00\x09')]
+
+def test_unchanged_write_is_dropped():
+    c = Coalescer()
+    c.write(0, b'\x12\x34')
+    assert len(c.flush()) == 1
+    c.write(0, b'\x12\x34')
+    assert c.flush() == []
+
+def test_partial_word_update_needs_the_rest_of_the_word():
+    c = Coalescer()
+    bit = vp(0x100, VP_Type.BIT, bit=3)
+    with pytest.raises(ValueError):
+        c.update(bit, 1)
+    low = vp(0x101, VP_Type.BYTE, low_byte=True)
+    with pytest.raises(ValueError):
+        c.update(low, 0x56)
+
+def test_partial_word_update_keeps_the_observed_rest():
+    c = Coalescer()
+    c.observe(0x200, b'\x12\x34')
+    c.update(vp(0x100, VP_Type.BIT, bit=3), 1)
+    assert c.flush() == [frame(0x100, b'\x12\x3c')]
+    c.observe(0x202, b'\x12\x34')
+    c.update(vp(0x101, VP_Type.BYTE, low_byte=True), 0x56)
+    assert c.flush() == [frame(0x101, b'\x12\x56')]
+
+def test_volatile_word_is_resent():
+    # the panel may have changed it since: the host's value has to go out
+    c = Coalescer()
+    c.mark_volatile(0x20, 0x22)
+    word = vp(0x10, VP_Type.WORD)
+    c.update(word, 5)
+    assert c.flush() == [frame(0x10, b'\x00\x05')]
+    c.update(word, 5)
+    assert c.flush() == [frame(0x10, b'\x00\x05')]
+
+def test_observed_volatile_word_is_deduplicated():
+    c = Coalescer()
+    c.mark_volatile(0x20, 0x22)
+    word = vp(0x10, VP_Type.WORD)
+    c.update(word, 5)
+    c.flush()
+    c.observe(0x20, b'\x00\x05')
+    c.update(word, 5)
+    assert c.flush() == []
+    c.observe(0x20, b'\x00\x07')
+    c.update(word, 5)
+    assert c.flush() == [frame(0x10, b'\x00\x05')]
+
+def test_volatile_word_is_not_gap_filler():
+    c = Coalescer()
+    c.observe(0, bytes(8))
+    c.mark_volatile(2, 4)
+    c.write(0, b'\x00\x01')
+    c.write(4, b'\x00\x02')
+    assert c.flush() == [frame(0, b'\x00\x01'), frame(2, b'\x00\x02')]